@@ -1,12 +1,17 @@
 from flask import Flask, render_template, request, jsonify
-import os, time, re, requests, shutil, subprocess, unicodedata, html as html_mod
+import os, time, re, json, requests, shutil, subprocess, unicodedata, codecs, html as html_mod
 import queue
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from urllib.parse import urljoin
+from functools import lru_cache
+from contextlib import contextmanager
+from urllib.parse import urljoin, urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dataclasses import dataclass
 from typing import Optional, List, Tuple
 
-from seleniumwire import webdriver  # pip install selenium-wire
+from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.action_chains import ActionChains
@@ -38,6 +43,21 @@ try:
 except ImportError:
     SELENIUM_CDP_ENABLED = False
 
+# Optional: C HTML parser for page titles (regex fallback below when missing)
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+    SELECTOLAX_ENABLED = True
+except ImportError:
+    SELECTOLAX_ENABLED = False
+
+# Optional: HTTP/2 client for playlist/segment requests (requests session fallback)
+try:
+    import httpx
+    import h2  # noqa: F401 - needed by httpx for http2=True
+    HTTPX_ENABLED = True
+except ImportError:
+    HTTPX_ENABLED = False
+
 from m3u8_sniffer_utils import filter_and_prioritize_m3u8s, select_best_variant
 
 import logging
@@ -50,6 +70,36 @@ app = Flask(__name__)
 
 UA = "Mozilla/5.0"
 DEFAULT_REFERER = None
+MAX_BATCH_WORKERS = 4  # Each worker may run its own Chrome - cap to avoid OOM
+YTDLP_FRAGMENT_WORKERS = 16  # HLS fragments are small and latency-bound
+ARIA2C_PATH = shutil.which("aria2c")  # optional external downloader for yt-dlp
+FFMPEG_PATH = shutil.which("ffmpeg")  # resolved once - restart the server after installing ffmpeg
+
+# Shared HTTP session - keep-alive + connection pooling for title/playlist/segment requests
+_BASE_HEADERS = {"User-Agent": UA, "Accept-Language": "he-IL,he;q=0.9,en-US;q=0.8"}
+_SESSION = requests.Session()
+_SESSION.headers.update(_BASE_HEADERS)
+_adapter = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=64,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+)
+_SESSION.mount("https://", _adapter)
+_SESSION.mount("http://", _adapter)
+
+# CDN requests (playlists, segment probes, warm-up) multiplex over one HTTP/2 connection per host
+_CDN_CLIENT = None
+if HTTPX_ENABLED:
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # it logs every request at INFO
+    _CDN_CLIENT = httpx.Client(
+        headers=_BASE_HEADERS,
+        follow_redirects=True,
+        transport=httpx.HTTPTransport(
+            http2=True,
+            retries=3,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        ),
+    )
 
 # ---------------- Generic downloader (yt-dlp) ----------------
 def _format_progress_percent(d: dict) -> float | None:
@@ -98,7 +148,7 @@ def download_with_ytdlp(page_url: str, out_dir: str, progress_cb=None) -> dict:
         'noprogress': True,
         'outtmpl': os.path.join(out_dir, '%(title)s.%(ext)s'),
         'merge_output_format': 'mp4',
-        'concurrent_fragment_downloads': 4,
+        'concurrent_fragment_downloads': YTDLP_FRAGMENT_WORKERS,
         'retries': 3,
         'http_headers': {
             'User-Agent': UA,
@@ -109,6 +159,10 @@ def download_with_ytdlp(page_url: str, out_dir: str, progress_cb=None) -> dict:
         # Prefer best video+audio; fall back to best muxed
         'format': 'bv*+ba/b',
     }
+    if ARIA2C_PATH:
+        # aria2c fetches fragments/files over several keep-alive connections per host
+        ydl_opts['external_downloader'] = {'default': 'aria2c'}
+        ydl_opts['external_downloader_args'] = {'aria2c': ['-x', '16', '-s', '16', '-k', '1M']}
 
     with YoutubeDL(ydl_opts) as ydl:
         print(f"[yt-dlp] מחלץ מידע...")
@@ -136,65 +190,132 @@ def download_with_ytdlp(page_url: str, out_dir: str, progress_cb=None) -> dict:
         }
 
 # ---------------- Title helpers ----------------
+_RE_ZW   = re.compile(r"[\u200B-\u200F\u202A-\u202E]")
+_RE_WS   = re.compile(r"\s+")
+_RE_OG   = re.compile(r'<meta\s+property=["\']og:title["\']\s+content=["\'](.*?)["\']', re.I | re.S)
+_RE_H1   = re.compile(r"<h1[^>]*>(.*?)</h1>", re.I | re.S)
+_RE_TAGS = re.compile(r"<[^>]+>")
+_RE_CTRL = re.compile(r"[\x00-\x1f\x7f]")
+_RE_WIN  = re.compile(r'[<>:\"/\\|?*]')
+_WIN_RESERVED = frozenset({"CON", "PRN", "AUX", "NUL",
+                           *(f"COM{i}" for i in range(1, 10)), *(f"LPT{i}" for i in range(1, 10))})
+
+@lru_cache(maxsize=1024)
 def _norm_text(s: str) -> str:
     if not s:
         return ""
     s = unicodedata.normalize("NFKC", s)
-    s = re.sub(r"[\u200B-\u200F\u202A-\u202E]", "", s)
+    s = _RE_ZW.sub("", s)
     s = s.strip().strip('\'"“”„‟‚‛❝❞')
-    s = re.sub(r"\s+", " ", s).strip()
+    s = _RE_WS.sub(" ", s).strip()
     return s
 
-def extract_title_via_http(url: str, timeout=12) -> Optional[str]:
+TITLE_MAX_BYTES = 65536  # og:title lives in <head>, h1 near the top - no need for the whole page
+
+_RE_HEAD_END = re.compile(r"</head\s*>", re.I)
+_RE_H1_OPEN  = re.compile(r"<h1", re.I)
+
+def _read_html_head(r) -> str:
+    """Read a streamed HTML response only until a title candidate is available."""
     try:
-        r = requests.get(
-            url,
-            headers={"User-Agent": UA, "Accept-Language": "he-IL,he;q=0.9,en-US;q=0.8", "Referer": url},
-            timeout=timeout,
-        )
-        r.raise_for_status()
-        html_text = r.text
-    except Exception:
-        return None
+        decoder = codecs.getincrementaldecoder(r.encoding or "utf-8")(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parts = []
+    size = 0
+    tail = ""         # text from the last '<' of what was already scanned (a tag cut by the chunk edge)
+    h1_text = None    # text from the first '<h1' on, where an h1 match has to start
+    head_over = False
+    for chunk in r.iter_content(8192):
+        size += len(chunk)
+        piece = decoder.decode(chunk)  # keeps a split multi-byte char for the next chunk
+        parts.append(piece)
+        # Only the new text (plus a tag cut at the last edge) can hold a new match
+        window = tail + piece
+        if _RE_OG.search(window) or size > TITLE_MAX_BYTES:
+            break
+        if h1_text is None:
+            m = _RE_H1_OPEN.search(window)
+            if m:
+                h1_text = window[m.start():]
+        else:
+            h1_text += piece
+        # No og:title once <head> is over - the h1 fallback is enough
+        head_over = head_over or bool(_RE_HEAD_END.search(window))
+        if head_over and h1_text is not None and _RE_H1.search(h1_text):
+            break
+        lt = window.rfind("<")
+        tail = window[lt:] if lt >= 0 else ""
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts)
+
+def _title_from_html(html_text: str) -> Optional[str]:
+    """og:title, else the first <h1> text - parsed by selectolax when installed."""
+    if SELECTOLAX_ENABLED:
+        tree = HTMLParser(html_text)
+        og = tree.css_first('meta[property="og:title"]')
+        t = _norm_text(og.attributes.get("content") or "") if og else ""
+        if t:
+            return t
+        h1 = tree.css_first("h1")
+        t = _norm_text(h1.text(separator=" ")) if h1 else ""
+        return t or None
 
-    m = re.search(r'<meta\s+property=["\']og:title["\']\s+content=["\'](.*?)["\']', html_text, re.I | re.S)
+    m = _RE_OG.search(html_text)
     if m:
         t = _norm_text(html_mod.unescape(m.group(1)))
         if t:
             return t
 
-    m = re.search(r"<h1[^>]*>(.*?)</h1>", html_text, re.I | re.S)
+    m = _RE_H1.search(html_text)
     if m:
-        inner = re.sub(r"<[^>]+>", " ", m.group(1))
+        inner = _RE_TAGS.sub(" ", m.group(1))
         t = _norm_text(html_mod.unescape(inner))
         if t:
             return t
     return None
 
+def extract_title_via_http(url: str, timeout=12) -> Optional[str]:
+    try:
+        r = _SESSION.get(
+            url,
+            headers={"Referer": url},
+            timeout=timeout,
+            stream=True,
+        )
+        with r:
+            r.raise_for_status()
+            html_text = _read_html_head(r)
+    except Exception:
+        return None
+
+    return _title_from_html(html_text)
+
+@lru_cache(maxsize=1024)
 def safe_windows_filename(name: str, max_len: int = 150) -> str:
     if not name:
         return "video"
     name = unicodedata.normalize("NFKC", name)
-    name = re.sub(r"[\x00-\x1f\x7f]", "", name)
-    name = re.sub(r'[<>:\"/\\|?*]', "_", name)
-    name = re.sub(r"\s+", " ", name).strip()
-    reserved = {"CON","PRN","AUX","NUL", *{f"COM{i}" for i in range(1,10)}, *{f"LPT{i}" for i in range(1,10)}}
+    name = _RE_CTRL.sub("", name)
+    name = _RE_WIN.sub("_", name)
+    name = _RE_WS.sub(" ", name).strip()
     base_only = os.path.splitext(name)[0].upper()
-    if base_only in reserved:
+    if base_only in _WIN_RESERVED:
         name = f"_{name}"
     name = name.rstrip(" .")
     return (name[:max_len].rstrip()) or "video"
 
 # ---------------- New M3U8 Capture (CDP-based) ----------------
-def try_capture_m3u8_via_cdp(page_url: str, timeout: int = 20) -> Tuple[set, Optional[str], dict]:
+def try_capture_m3u8_via_cdp(page_url: str, timeout: int = 20, browser_manager=None) -> Tuple[set, Optional[str], dict]:
     """
     Try to capture m3u8 URLs using new CDP-based methods (Playwright or Selenium CDP).
     
-    This is much lighter and faster than selenium-wire.
+    This is much lighter and faster than the non-headless Selenium fallback.
     
     Args:
         page_url: URL to capture from
         timeout: Timeout in seconds
+        browser_manager: Optional PlaywrightBrowserManager to reuse (same thread only)
         
     Returns:
         Tuple of (found_m3u8_urls_set, master_manifest_url, empty_dict_for_headers)
@@ -208,7 +329,7 @@ def try_capture_m3u8_via_cdp(page_url: str, timeout: int = 20) -> Tuple[set, Opt
         try:
             m3u8_infos = capture_m3u8_via_playwright(
                 url=page_url,
-                browser_manager=None,  # Fresh browser for now
+                browser_manager=browser_manager,  # None -> fresh browser for this URL
                 timeout=timeout,
                 wait_after_load=3.0
             )
@@ -265,13 +386,24 @@ def try_capture_m3u8_via_cdp(page_url: str, timeout: int = 20) -> Tuple[set, Opt
             logger.warning(f"⚠️ Selenium CDP capture failed: {e}")
     
     # If both methods unavailable or failed
-    logger.info("ℹ️ CDP capture not available or failed, will use selenium-wire fallback")
+    logger.info("ℹ️ CDP capture not available or failed, will use Selenium fallback")
     return set(), None, {}
 
 # ---------------- HLS helpers ----------------
+_RE_ATTR_SPLIT = re.compile(r',(?![^\"]*\")')
+_RE_IDS        = re.compile(r"/entryId/([^/]+)/.*?/flavorId/([^/]+)/")
+_RE_KALTURA_MANIFEST = re.compile(r"kaltura\.com.*playmanifest", re.I)
+_RE_KALTURA_CDN_MANIFEST = re.compile(r"(?:cdnapisec|cfvod)\.kaltura\.com.*playmanifest", re.I)
+
+_RE_KALTURA_PLAYLIST = re.compile(r"kaltura\.com.*\.m3u8\Z", re.I)
+
+def _is_master(url: str) -> bool:
+    """Kaltura playManifest on either CDN (cdnapisec / cfvod) - the URL variants are listed from."""
+    return bool(_RE_KALTURA_CDN_MANIFEST.search(url))
+
 def parse_attribute_list(s: str):
     out = {}
-    for part in re.split(r',(?![^\"]*\")', s):
+    for part in _RE_ATTR_SPLIT.split(s):
         if '=' in part:
             k, v = part.split('=', 1)
             v = v.strip()
@@ -280,14 +412,51 @@ def parse_attribute_list(s: str):
             out[k.strip()] = v
     return out
 
-def fetch_text(url: str, referer: str):
-    r = requests.get(url, headers={"Referer": referer or url, "User-Agent": UA}, timeout=20)
-    r.raise_for_status()
-    return r.text
+@contextmanager
+def _cdn_get(url: str, headers: dict, timeout: float):
+    """Streamed GET via _CDN_CLIENT when httpx is installed, else the shared requests session."""
+    if _CDN_CLIENT is not None:
+        with _CDN_CLIENT.stream("GET", url, headers=headers, timeout=timeout) as r:
+            yield r
+    else:
+        with _SESSION.get(url, headers=headers, timeout=timeout, stream=True) as r:
+            yield r
+
+def _cdn_iter_body(r, chunk_size: int):
+    """Iterate the raw body of a _cdn_get response in chunk_size reads."""
+    if _CDN_CLIENT is not None:
+        return r.iter_bytes(chunk_size)
+    return r.iter_content(chunk_size)
+
+def _cdn_drain(r):
+    """
+    Read the rest of a _cdn_get response so its keep-alive connection goes back
+    to the pool (closing an unread response drops the socket).
+    """
+    for _ in _cdn_iter_body(r, 65536):
+        pass
+
+def fetch_lines(url: str, referer: str):
+    """Yield the stripped lines of a playlist as they stream in (no full-body copy)."""
+    with _cdn_get(url, {"Referer": referer or url}, timeout=20) as r:
+        r.raise_for_status()
+        if _CDN_CLIENT is not None:
+            lines = r.iter_lines()  # httpx decodes as UTF-8 unless a charset is declared
+        else:
+            r.encoding = r.encoding or "utf-8"  # playlists are UTF-8 (RFC 8216) and rarely declare a charset
+            lines = r.iter_lines(chunk_size=8192, decode_unicode=True)  # default is 512-byte reads
+        for raw in lines:
+            line = raw.strip()
+            if line:
+                yield line
 
 def head_size(url: str, referer: str):
     try:
-        h = requests.head(url, headers={"Referer": referer or url, "User-Agent": UA}, timeout=15, allow_redirects=True)
+        headers = {"Referer": referer or url}
+        if _CDN_CLIENT is not None:
+            h = _CDN_CLIENT.head(url, headers=headers, timeout=15)
+        else:
+            h = _SESSION.head(url, headers=headers, timeout=15, allow_redirects=True)
         if h.status_code < 400:
             cl = h.headers.get("Content-Length")
             return int(cl) if cl and cl.isdigit() else None
@@ -295,48 +464,123 @@ def head_size(url: str, referer: str):
         pass
     return None
 
+_PROBE_CHUNK = 256 * 1024  # read size when a segment has to be counted
+
+def probe_size(url: str, referer: str):
+    """
+    Segment size via a one-byte ranged GET: many CDNs block HEAD or drop
+    Content-Length on it, but answer "Content-Range: bytes 0-0/<total>".
+    """
+    try:
+        with _cdn_get(url, {"Referer": referer or url, "Range": "bytes=0-0"}, timeout=15) as r:
+            if r.status_code < 400:
+                total = r.headers.get("Content-Range", "").rsplit("/", 1)[-1]
+                if total.isdigit():
+                    _cdn_drain(r)  # the 1-byte body - keeps the connection reusable
+                    return int(total)
+                if r.status_code == 200:  # Range ignored - full-body length
+                    cl = r.headers.get("Content-Length")
+                    if cl and cl.isdigit():
+                        return int(cl)
+                    # Chunked body without a length - count it in large reads
+                    return sum(len(chunk) for chunk in _cdn_iter_body(r, _PROBE_CHUNK)) or None
+    except Exception:
+        pass
+    return None
+
+_WARMUP_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="warmup")
+
+def warm_connections(urls, referer: str, skip_url: Optional[str] = None):
+    """
+    Fire-and-forget HEADs (one per host) so TLS handshakes are done and the
+    keep-alive connections sit in the CDN client's pool before the analysis starts.
+    """
+    skip_host = urlsplit(skip_url).netloc if skip_url else None
+    by_host = {}
+    for u in urls:
+        host = urlsplit(u).netloc
+        if host and host != skip_host:
+            by_host.setdefault(host, u)
+    for u in by_host.values():
+        _WARMUP_POOL.submit(head_size, u, referer)
+
+def make_url_resolver(base_url: str):
+    """
+    urljoin(base_url, ref) specialised for one playlist: the base is split once,
+    and plain segment names / absolute paths are just concatenated. Anything
+    urljoin would normalise (dot segments, empty queries...) is handed to it.
+    refs are stripped playlist lines, as fetch_lines yields them.
+    """
+    parts = urlsplit(base_url)
+    if "/." in parts.path or "//" in parts.path:
+        return lambda ref: urljoin(base_url, ref)  # dot / empty segments in the base path
+    origin = f"{parts.scheme}://{parts.netloc}"
+    base_dir = origin + parts.path[:parts.path.rfind("/") + 1] if "/" in parts.path else origin + "/"
+
+    def resolve(ref: str) -> str:
+        # urljoin drops empty queries, fragments and params, and resolves dot segments
+        if "#" in ref or ";" in ref or "/." in ref or ref.endswith("?") or ref[:1] in ("?", ".", ""):
+            return urljoin(base_url, ref)
+        host_start = ref.find("//") + 2
+        has_host = ref[host_start:host_start + 1] not in "/?"  # "" (end of ref) is in any string
+        if has_host and ref.startswith(("https://", "http://")):
+            return ref
+        if has_host and ref.startswith("//"):
+            return f"{parts.scheme}:{ref}"
+        if ":" in ref or "//" in ref:
+            return urljoin(base_url, ref)  # other schemes, empty path segments
+        if ref.startswith("/"):
+            return origin + ref
+        return base_dir + ref
+    return resolve
+
 def list_variants_from_master(master_url: str, referer: str):
-    text = fetch_text(master_url, referer=referer)
     variants = []
-    lines = [ln.strip() for ln in text.splitlines()]
-    for i, line in enumerate(lines):
-        if line.upper().startswith("#EXT-X-STREAM-INF:"):
-            attrs = parse_attribute_list(line.split(":", 1)[1])
-            if i + 1 < len(lines):
-                pl = urljoin(master_url, lines[i + 1].strip())
-                bw = attrs.get("AVERAGE-BANDWIDTH") or attrs.get("BANDWIDTH") or "0"
-                try: bw = int(bw)
-                except: bw = 0
-                variants.append({
-                    "playlist": pl,
-                    "bandwidth": bw,
-                    "resolution": attrs.get("RESOLUTION"),
-                    "codecs": attrs.get("CODECS")
-                })
+    pending_attrs = None  # attrs of an #EXT-X-STREAM-INF waiting for its URI line
+    resolve = make_url_resolver(master_url)
+    for line in fetch_lines(master_url, referer=referer):
+        if pending_attrs is not None:
+            attrs, pending_attrs = pending_attrs, None
+            pl = resolve(line)
+            bw = attrs.get("AVERAGE-BANDWIDTH") or attrs.get("BANDWIDTH") or "0"
+            try: bw = int(bw)
+            except: bw = 0
+            variants.append({
+                "playlist": pl,
+                "bandwidth": bw,
+                "resolution": attrs.get("RESOLUTION"),
+                "codecs": attrs.get("CODECS")
+            })
+        if line.startswith("#EXT-X-STREAM-INF:"):  # tags are case-sensitive (RFC 8216)
+            pending_attrs = parse_attribute_list(line.split(":", 1)[1])
     return variants
 
 def analyze_variant(variant_url: str, referer: str):
-    text = fetch_text(variant_url, referer=referer)
-    lines = [ln.strip() for ln in text.splitlines()]
-    encrypted = any(ln.startswith("#EXT-X-KEY:") for ln in lines)
-    is_vod = any(ln == "#EXT-X-ENDLIST" for ln in lines)
+    encrypted = False
+    is_vod = False
 
+    # Single pass over the streamed playlist - the body is never held as one string
     total_seconds = 0.0
     segments = []
     last_dur = None
-    for ln in lines:
-        if ln.startswith("#EXTINF:"):
-            dur_str = ln.split(":", 1)[1].split(",", 1)[0].strip()
-            try:
-                last_dur = float(dur_str)
-            except:
-                last_dur = None
-        elif not ln.startswith("#") and ln:
-            seg_url = urljoin(variant_url, ln)
-            if last_dur is not None:
-                segments.append((last_dur, seg_url))
-                total_seconds += last_dur
-                last_dur = None
+    resolve = make_url_resolver(variant_url)
+    for ln in fetch_lines(variant_url, referer=referer):
+        if ln.startswith("#"):
+            if ln.startswith("#EXTINF:"):
+                dur_str = ln.split(":", 1)[1].split(",", 1)[0].strip()
+                try:
+                    last_dur = float(dur_str)
+                except:
+                    last_dur = None
+            elif ln.startswith("#EXT-X-KEY:"):
+                encrypted = True
+            elif ln == "#EXT-X-ENDLIST":
+                is_vod = True
+        elif last_dur is not None:
+            # URI lines without a preceding #EXTINF are ignored - don't resolve them
+            segments.append((last_dur, resolve(ln)))
+            total_seconds += last_dur
+            last_dur = None
 
     return {
         "is_vod": is_vod,
@@ -345,6 +589,7 @@ def analyze_variant(variant_url: str, referer: str):
         "segments": segments
     }
 
+@lru_cache(maxsize=1024)
 def human_time(sec: float | int | None):
     if sec is None:
         return "N/A"
@@ -353,13 +598,23 @@ def human_time(sec: float | int | None):
     m, s = divmod(s, 60)
     return f"{h:02d}:{m:02d}:{s:02d}"
 
-def estimate_bitrate_mbps(segments, referer: str, sample_n=3):
+def estimate_bitrate_mbps(segments, referer: str, sample_n=1):
+    """
+    Estimate bitrate from the sizes of the first sample_n segments.
+    One segment is probed directly; larger samples probe concurrently.
+    """
     samples = segments[:sample_n]
     if not samples: return None
+    urls = [surl for _, surl in samples]
+    if len(samples) == 1:
+        # Nothing to overlap - skip the thread handoff
+        sizes = [probe_size(urls[0], referer)]
+    else:
+        with ThreadPoolExecutor(max_workers=min(8, len(samples))) as ex:
+            sizes = list(ex.map(probe_size, urls, [referer] * len(urls)))
     total_bytes = 0
     total_secs = 0.0
-    for dur, surl in samples:
-        size = head_size(surl, referer=referer)
+    for (dur, _), size in zip(samples, sizes):
         if size:
             total_bytes += size
             total_secs += dur
@@ -378,17 +633,50 @@ def guess_resolution_from_bitrate(mbps: float | None) -> str | None:
     return "256x144"
 
 def extract_ids(url: str):
-    m = re.search(r"/entryId/([^/]+)/.*?/flavorId/([^/]+)/", url)
+    m = _RE_IDS.search(url)
     return (m.group(1), m.group(2)) if m else (None, None)
 
-# ---------------- Selenium-wire helpers ----------------
+# ---------------- Selenium fallback helpers ----------------
 PLAY_BTN_XPATH = '//*[@id="player-gui"]/div[3]/div[1]/div[3]/button'
 PLAY_BTN_CSS   = "button.playkit-pre-playback-play-button"
+PLAY_BTN_SELECTORS = ", ".join([PLAY_BTN_CSS, ".vjs-big-play-button", 'button[title="Play"]',
+                                'button[aria-label^="נגן"]', 'button[aria-label^="Play"]'])
+
+# Runs in the browser: arguments[0] = CSS selector group, arguments[1] = XPath.
+# Cross-origin iframes can't be reached from here - they get marked with data-m3u8-xo instead.
+CLICK_EVERYWHERE_JS = """
+    var SELECTORS = arguments[0], XPATH = arguments[1];
+    var clicked = false, crossOrigin = 0;
+    function visible(el) { return !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length); }
+    function clickEl(el) {
+      try { el.scrollIntoView({block:'center', inline:'center'}); el.click(); clicked = true; } catch(e){}
+    }
+    function walk(doc) {
+      // XPath hits first, then the selector group; click only the first visible one so a
+      // button matched by both (or a play/pause toggle) isn't clicked twice and paused again.
+      var cands = [];
+      try {
+        var x = doc.evaluate(XPATH, doc, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        for (var i = 0; i < x.snapshotLength; i++) cands.push(x.snapshotItem(i));
+      } catch(e){}
+      try { cands.push.apply(cands, doc.querySelectorAll(SELECTORS)); } catch(e){}
+      for (var el of cands) { if (visible(el)) { clickEl(el); break; } }
+      var vids = doc.getElementsByTagName('video');
+      for (var v of vids) { try { v.muted = true; v.play(); } catch(e){} }
+      var frames = doc.getElementsByTagName('iframe');
+      for (var f of frames) {
+        var sub = null;
+        try { sub = f.contentDocument; } catch(e){}
+        if (sub) { walk(sub); } else { f.setAttribute('data-m3u8-xo', '1'); crossOrigin++; }
+      }
+    }
+    walk(document);
+    return {clicked: clicked, crossOrigin: crossOrigin};
+"""
 
 def try_click_el(driver, el):
     try:
         driver.execute_script("arguments[0].scrollIntoView({block:'center', inline:'center'});", el)
-        time.sleep(0.05)
         try:
             el.click(); return True
         except Exception:
@@ -408,60 +696,30 @@ def try_click_el(driver, el):
     return False
 
 def click_once_everywhere(driver):
+    """
+    Click visible play buttons and start <video> elements in the page and its iframes.
+    The document and same-origin iframes are handled in a single execute_script round-trip;
+    only cross-origin iframes (marked by the script) need a frame switch + one more call each.
+    """
     did = False
+    cross_origin = 0
     try:
-        for el in driver.find_elements(By.XPATH, PLAY_BTN_XPATH):
-            if el.is_displayed():
-                did |= try_click_el(driver, el)
+        res = driver.execute_script(CLICK_EVERYWHERE_JS, PLAY_BTN_SELECTORS, PLAY_BTN_XPATH) or {}
+        did = bool(res.get("clicked"))
+        cross_origin = res.get("crossOrigin") or 0
     except Exception:
         pass
+    if not cross_origin:
+        return did
     try:
-        for sel in [PLAY_BTN_CSS, ".vjs-big-play-button", 'button[title="Play"]',
-                    'button[aria-label^="נגן"]', 'button[aria-label^="Play"]']:
-            for el in driver.find_elements(By.CSS_SELECTOR, sel):
-                if el.is_displayed():
-                    did |= try_click_el(driver, el)
-    except Exception:
-        pass
-    try:
-        driver.execute_script("""
-            (function(){
-              var vids = document.getElementsByTagName('video');
-              for (var v of vids) { try { v.muted = true; v.play(); } catch(e){} }
-            })();
-        """)
-    except Exception:
-        pass
-    try:
-        frames = driver.find_elements(By.TAG_NAME, "iframe")
+        frames = driver.find_elements(By.CSS_SELECTOR, "iframe[data-m3u8-xo]")
     except Exception:
         frames = []
     for fr in frames:
         try:
             driver.switch_to.frame(fr)
-            try:
-                for el in driver.find_elements(By.XPATH, PLAY_BTN_XPATH):
-                    if el.is_displayed():
-                        did |= try_click_el(driver, el)
-            except Exception:
-                pass
-            try:
-                for sel in [PLAY_BTN_CSS, ".vjs-big-play-button", 'button[title="Play"]',
-                            'button[aria-label^="נגן"]', 'button[aria-label^="Play"]']:
-                    for el in driver.find_elements(By.CSS_SELECTOR, sel):
-                        if el.is_displayed():
-                            did |= try_click_el(driver, el)
-            except Exception:
-                pass
-            try:
-                driver.execute_script("""
-                    (function(){
-                      var vids = document.getElementsByTagName('video');
-                      for (var v of vids) { try { v.muted = true; v.play(); } catch(e){} }
-                    })();
-                """)
-            except Exception:
-                pass
+            res = driver.execute_script(CLICK_EVERYWHERE_JS, PLAY_BTN_SELECTORS, PLAY_BTN_XPATH) or {}
+            did |= bool(res.get("clicked"))
         except Exception:
             pass
         finally:
@@ -471,100 +729,107 @@ def click_once_everywhere(driver):
                 pass
     return did
 
-def poll_m3u8_optimized(driver, max_seconds=30):
+class NetworkEventCollector:
     """
-    Optimized version using wait_for_request for immediate capture.
-    This is MUCH faster than polling!
+    Collects m3u8 requests/responses from Chrome's performance log (CDP Network events).
+    get_log('performance') drains the browser-side buffer, so every drain() only sees new events.
     """
-    import threading
-    
-    found = set()
-    master_request = None
-    stop_clicking = threading.Event()
-    
-    def click_continuously():
-        """Background thread to keep clicking play button"""
-        while not stop_clicking.is_set():
-            try:
-                click_once_everywhere(driver)
-                time.sleep(0.3)
-            except Exception:
-                pass
-    
-    # Start clicking in background
-    click_thread = threading.Thread(target=click_continuously, daemon=True)
-    click_thread.start()
-    
-    try:
-        # Wait specifically for master manifest - this is BLOCKING and fast!
-        print(f"⏳ ממתין ל-Master Manifest (timeout: {max_seconds}s)...")
-        
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.found = set()
+        self.master_url = None
+        self.master_headers = {}
+
+    def drain(self):
+        """Process all Network events logged since the previous call."""
         try:
-            # Wait for master manifest specifically
-            request = driver.wait_for_request(
-                '.*kaltura.com.*playmanifest.*m3u8', 
-                timeout=max_seconds
-            )
-            print(f"✅ נתפס Master Manifest מיד!")
-            master_request = request
-            found.add(request.url)
-            stop_clicking.set()  # Stop clicking immediately
-            
-        except Exception as e:
-            print(f"⚠️ לא נתפס Master, מחפש m3u8 כלליים... ({e})")
-            # Fallback: collect any m3u8 files
+            logs = self.driver.get_log('performance')
+        except Exception:
+            return
+        for entry in logs:
+            raw = entry.get('message') or ""
+            # Scope like a capture filter: only m3u8-looking request/response events are
+            # JSON-decoded; segment/dataReceived/loadingFinished noise is skipped as a string.
+            if '"Network.re' not in raw:
+                continue
+            low = raw.lower()
+            if "m3u8" not in low and "mpegurl" not in low and "playmanifest" not in low:
+                continue
             try:
-                request = driver.wait_for_request('.*\\.m3u8', timeout=10)
-                found.add(request.url)
-                print(f"✅ נמצא m3u8 חלופי")
-            except Exception:
-                pass
-            stop_clicking.set()
-        
-        # Small grace period to catch additional variants
-        time.sleep(0.5)
-        
-        # Collect all m3u8 requests found so far
-        for req in driver.requests:
-            if not getattr(req, "response", None):
+                msg = json.loads(raw)['message']
+            except (ValueError, KeyError, TypeError):
                 continue
-            url = req.url or ""
-            ct = (req.response.headers or {}).get("Content-Type", "").lower()
-            if (".m3u8" in url.lower()) or ("mpegurl" in ct):
-                found.add(url)
-                # Check for master manifest from any Kaltura CDN
-                if "kaltura.com" in url and "playmanifest" in url.lower():
-                    master_request = req
-                    
-    finally:
-        stop_clicking.set()
-        click_thread.join(timeout=1)
-    
-    cookie_str = "; ".join([f"{c['name']}={c['value']}" for c in driver.get_cookies()])
+            method = msg.get('method')
+            params = msg.get('params') or {}
+            if method == 'Network.requestWillBeSent':
+                # Request side: catches playManifest even when it redirects to the CDN
+                req = params.get('request') or {}
+                url = req.get('url') or ""
+                is_manifest = bool(_RE_KALTURA_MANIFEST.search(url))
+                if is_manifest or ".m3u8" in url.lower():
+                    self._add(url, req.get('headers') or {}, is_manifest)
+            elif method == 'Network.responseReceived':
+                # Response side: m3u8 served from URLs without the extension
+                resp = params.get('response') or {}
+                url = resp.get('url') or ""
+                if "mpegurl" in (resp.get('mimeType') or "").lower():
+                    self._add(url, resp.get('requestHeaders') or {}, bool(_RE_KALTURA_MANIFEST.search(url)))
+
+    def _add(self, url: str, headers: dict, is_manifest: bool):
+        self.found.add(url)
+        # Master manifest from either Kaltura CDN (is_manifest classified once by the caller)
+        if self.master_url is None and is_manifest and _is_master(url):
+            self.master_url = url
+            self.master_headers = dict(headers)
+
+def _cookie_header(driver) -> str:
+    return "; ".join([f"{c['name']}={c['value']}" for c in driver.get_cookies()])
+
+def poll_m3u8_optimized(driver, max_seconds=30, interval=0.2, grace_after_master=0.8):
+    """
+    Capture m3u8 URLs from CDP Network events (no MITM proxy).
+    Clicks once, then drains the event log until the master manifest shows up,
+    plus a short grace to pick up the variant playlists requested right after it.
+    """
+    events = NetworkEventCollector(driver)
+    deadline = time.time() + max_seconds
+    reclick_at = time.time() + min(5, max_seconds)
     
-    master_manifest_url = None
-    for u in found:
-        # Look for master manifest from any Kaltura CDN
-        if "kaltura.com" in u and "playmanifest" in u.lower():
-            master_manifest_url = u
+    print(f"⏳ ממתין ל-Master Manifest (timeout: {max_seconds}s)...")
+    click_once_everywhere(driver)
+    while time.time() < deadline:
+        events.drain()
+        if events.master_url:
+            print(f"✅ נתפס Master Manifest מיד!")
+            grace_end = min(deadline, time.time() + grace_after_master)
+            while time.time() < grace_end:
+                time.sleep(interval)
+                events.drain()
             break
+        if reclick_at is not None and time.time() >= reclick_at:
+            # Player may not have been ready yet - click once more and wait out the rest
+            click_once_everywhere(driver)
+            reclick_at = None
+        time.sleep(interval)
     
-    captured_headers = {}
-    if master_request:
-        try:
-            for k, v in (master_request.headers or {}).items():
-                captured_headers[k] = v
-        except Exception:
-            pass
+    if not events.master_url and not events.found:
+        print(f"⚠️ לא נתפס Master, מחפש m3u8 כלליים...")
+        # Fallback: wait a bit longer for any m3u8
+        extra_deadline = time.time() + 10
+        while not events.found and time.time() < extra_deadline:
+            time.sleep(interval)
+            events.drain()
+        if events.found:
+            print(f"✅ נמצא m3u8 חלופי")
     
-    return found, master_manifest_url, captured_headers, cookie_str
+    return events.found, events.master_url, events.master_headers, _cookie_header(driver)
 
 def poll_m3u8(driver, max_seconds=90, interval=0.3, grace_after_first=2, min_links_to_stop=2):
     """Fallback polling method (kept for compatibility)"""
     start = time.time()
-    found = set()
+    events = NetworkEventCollector(driver)
     t_first = None
-    master_request = None
     master_found_time = None
 
     while time.time() - start < max_seconds:
@@ -572,34 +837,20 @@ def poll_m3u8(driver, max_seconds=90, interval=0.3, grace_after_first=2, min_lin
         if master_found_time is None:
             click_once_everywhere(driver)
         
-        try:
-            for req in driver.requests:
-                if not getattr(req, "response", None):
-                    continue
-                url = req.url or ""
-                ct  = (req.response.headers or {}).get("Content-Type", "").lower()
-                if (".m3u8" in url.lower()) or ("mpegurl" in ct):
-                    found.add(url)
-                    # Check if this is the master manifest (any Kaltura CDN)
-                    if "kaltura.com" in url and "playmanifest" in url.lower():
-                        master_request = req
-                        if master_found_time is None:
-                            master_found_time = time.time()
-                            print(f"✅ נתפס Master Manifest! ממתין {grace_after_first} שניות נוספות...")
-        except Exception:
-            pass
-
-        has_master = any(("kaltura.com" in u and "playmanifest" in u.lower()) for u in found)
+        events.drain()
+        if events.master_url and master_found_time is None:
+            master_found_time = time.time()
+            print(f"✅ נתפס Master Manifest! ממתין {grace_after_first} שניות נוספות...")
         
         # If we found master manifest, wait only grace_after_first seconds and stop
-        if has_master and master_found_time and (time.time() - master_found_time >= grace_after_first):
+        if master_found_time and (time.time() - master_found_time >= grace_after_first):
             print(f"⚡ Master Manifest נתפס, סוגר דפדפן!")
             break
         
         # Original logic for non-master m3u8 files
-        if found and t_first is None:
+        if events.found and t_first is None:
             t_first = time.time()
-        if t_first is not None and len(found) >= min_links_to_stop and (time.time() - t_first >= grace_after_first):
+        if t_first is not None and len(events.found) >= min_links_to_stop and (time.time() - t_first >= grace_after_first):
             break
 
         # Shorter sleep when master is found (just waiting for grace period)
@@ -608,110 +859,222 @@ def poll_m3u8(driver, max_seconds=90, interval=0.3, grace_after_first=2, min_lin
         else:
             time.sleep(interval)
 
-    cookie_str = "; ".join([f"{c['name']}={c['value']}" for c in driver.get_cookies()])
+    return events.found, events.master_url, events.master_headers, _cookie_header(driver)
+
+_CHROMEDRIVER_PATH = None
+_CHROMEDRIVER_LOCK = threading.Lock()
+
+def get_chromedriver_path() -> str:
+    """Resolve the ChromeDriver binary once per process (install() does filesystem + network checks)."""
+    global _CHROMEDRIVER_PATH
+    if _CHROMEDRIVER_PATH is None:
+        with _CHROMEDRIVER_LOCK:
+            if _CHROMEDRIVER_PATH is None:
+                _CHROMEDRIVER_PATH = ChromeDriverManager().install()
+    return _CHROMEDRIVER_PATH
+
+FALLBACK_CHROME_ARGS = [
+    "--mute-audio",
+    "--autoplay-policy=no-user-gesture-required",
+    "--disable-notifications",
+    "--window-size=1366,900",
+    "--disable-gpu",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-sync",
+    "--disable-translate",
+    # HLS detection doesn't need images
+    "--blink-settings=imagesEnabled=false",
+    # Keep cross-origin player iframes in-process so their requests show up in the performance log
+    "--disable-features=IsolateOrigins,site-per-process",
+]
+
+# Never fetched by the fallback browser (CSS stays - players need it to lay out the play button)
+FALLBACK_BLOCKED_URLS = ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.woff", "*.woff2", "*.ttf"]
+
+def create_fallback_driver():
+    """Create a (non-headless) Chrome driver that reports Network events via CDP."""
+    options = webdriver.ChromeOptions()
+    for arg in FALLBACK_CHROME_ARGS:
+        options.add_argument(arg)
+    # Use eager page load strategy - don't wait for all resources (images, etc)
+    options.page_load_strategy = 'eager'
+    # Note: NOT using headless mode as it may interfere with video player detection
+    
+    # Add logging to help debug
+    options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    # CDP Network events are delivered through the performance log
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    # ...and only Network events: Page/timeline events would just be decoded and dropped
+    options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+
+    service = Service(get_chromedriver_path())
+    driver = webdriver.Chrome(service=service, options=options)
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': FALLBACK_BLOCKED_URLS})
+    # Set page load timeout to 60 seconds (sometimes pages are slow)
+    driver.set_page_load_timeout(60)
+    return driver
+
+class FallbackDriverPool:
+    """
+    Pool of idle fallback Chrome drivers reused across the URLs of a batch.
+    Each concurrent worker checks a driver out, so drivers are never shared between threads.
+    Chrome startup costs seconds - resetting a driver between URLs is much cheaper.
+    """
 
-    master_manifest_url = None
-    for u in found:
-        # Look for master manifest from any Kaltura CDN
-        if "kaltura.com" in u and "playmanifest" in u.lower():
-            master_manifest_url = u
-            break
+    def __init__(self):
+        self._idle = queue.LifoQueue()
 
-    captured_headers = {}
-    if master_request:
+    def acquire(self):
+        """Get an idle driver, creating a new one if none is available."""
         try:
-            for k, v in (master_request.headers or {}).items():
-                captured_headers[k] = v
-        except Exception:
-            pass
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return create_fallback_driver()
 
-    return found, master_manifest_url, captured_headers, cookie_str
+    def release(self, driver, reusable: bool = True):
+        """Reset the driver and return it to the pool (or quit it if it is broken)."""
+        if reusable:
+            try:
+                driver.delete_all_cookies()
+                driver.get("about:blank")
+                driver.get_log('performance')  # drop events left over from the previous page
+                self._idle.put(driver)
+                return
+            except Exception as e:
+                print(f"Warning: Failed to reset driver, discarding: {e}")
+        self._quit(driver)
+
+    def close_all(self):
+        """Quit all idle drivers."""
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(driver)
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception as quit_error:
+            print(f"Warning: Failed to quit driver: {quit_error}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close_all()
 
 # ---------------- FFmpeg helpers ----------------
+_RE_FS_BAD    = re.compile(r'[\\/:*?"<>|]')
+_RE_RES_CLEAN = re.compile(r"[^\dxp]")
+_RE_CMD_SAFE  = re.compile(r"[\w\-+.,:=/]+")
+
+@lru_cache(maxsize=1024)
 def sanitize_filename(name: str) -> str:
-    name = re.sub(r'[\\/:*?"<>|]', "_", name)
-    name = re.sub(r"\s+", " ", name).strip()
+    name = _RE_FS_BAD.sub("_", name)
+    name = _RE_WS.sub(" ", name).strip()
     return name or "video"
 
-def build_ffmpeg_cmd(m3u8_url: str, out_mp4: str, referer: str, ua: str = UA) -> str:
-    headers = f"Referer: {referer}\\r\\nUser-Agent: {ua}"
-    cmd = (
-        'ffmpeg -y '
-        '-loglevel warning -stats '
-        '-protocol_whitelist "file,http,https,tcp,tls,crypto" '
-        f'-headers "{headers}" '
-        f'-i "{m3u8_url}" '
-        '-c copy -movflags +faststart -bsf:a aac_adtstoasc '
-        f'"{out_mp4}"'
-    )
-    return cmd
-
-def parse_ffmpeg_progress(line: str) -> dict:
-    """Parse FFmpeg progress line to extract frame, fps, time, bitrate, speed"""
+def build_ffmpeg_cmd(m3u8_url: str, out_mp4: str, referer: str, ua: str = UA) -> List[str]:
+    """Build the ffmpeg argv (run without a shell - no quoting/injection issues)."""
+    return [
+        "ffmpeg", "-y",
+        "-loglevel", "warning", "-stats",
+        "-protocol_whitelist", "file,http,https,tcp,tls,crypto",
+        "-headers", f"Referer: {referer}\r\nUser-Agent: {ua}\r\n",
+        "-i", m3u8_url,
+        "-c", "copy", "-movflags", "+faststart", "-bsf:a", "aac_adtstoasc",
+        out_mp4,
+    ]
+
+def format_ffmpeg_cmd(argv: List[str]) -> str:
+    """Printable command line for the UI / run_ffmpeg.cmd (header CRLFs kept as literal \\r\\n)."""
+    parts = []
+    for arg in argv:
+        arg = arg.replace("\r\n", "\\r\\n")
+        # Quote anything a shell could split or interpret (spaces, &, ?, %...)
+        parts.append(arg if _RE_CMD_SAFE.fullmatch(arg) else f'"{arg}"')
+    return " ".join(parts)
+
+# Passed by run_ffmpeg_with_progress: machine-readable key=value blocks on stdout
+FFMPEG_PROGRESS_ARGS = ["-nostats", "-progress", "pipe:1"]
+# Keys parse_ffmpeg_progress reads - everything else in a block is dropped on arrival
+_FF_PROGRESS_KEYS = frozenset(("frame", "fps", "out_time", "bitrate", "speed", "total_size"))
+
+def parse_ffmpeg_progress(block: dict) -> dict:
+    """Turn one -progress block (frame, fps, out_time, bitrate, speed...) into UI progress info"""
     result = {}
     try:
-        # FFmpeg outputs like: frame=12345 fps=30 q=-1.0 size=1234kB time=00:12:34.56 bitrate=1234.5kbits/s speed=1.5x
-        if 'frame=' in line:
-            match = re.search(r'frame=\s*(\d+)', line)
-            if match:
-                result['frame'] = int(match.group(1))
-        
-        if 'fps=' in line:
-            match = re.search(r'fps=\s*([\d.]+)', line)
-            if match:
-                result['fps'] = float(match.group(1))
-        
-        if 'time=' in line:
-            match = re.search(r'time=\s*([\d:\.]+)', line)
-            if match:
-                result['time'] = match.group(1)
-        
-        if 'bitrate=' in line:
-            match = re.search(r'bitrate=\s*([\d.]+)\s*kbits/s', line)
-            if match:
-                result['bitrate'] = f"{match.group(1)} kbps"
-        
-        if 'speed=' in line:
-            match = re.search(r'speed=\s*([\d.]+)x', line)
-            if match:
-                result['speed'] = f"{match.group(1)}x"
-        
-        if 'size=' in line:
-            match = re.search(r'size=\s*(\d+)kB', line)
-            if match:
-                result['size'] = f"{match.group(1)} KB"
+        # -progress blocks look like: frame=123 fps=30.00 bitrate=1234.5kbits/s total_size=1263616
+        # out_time=00:12:34.560000 speed=1.5x progress=continue (one key per line)
+        frame = block.get('frame', '')
+        if frame.isdigit():
+            result['frame'] = int(frame)
+        fps = block.get('fps', '')
+        if fps and fps != 'N/A':
+            result['fps'] = float(fps)
+        t = block.get('out_time', '')
+        if t[:1].isdigit():
+            result['time'] = t[:-4] if '.' in t else t  # microseconds -> hundredths, as -stats printed
+        bitrate = block.get('bitrate', '')
+        if bitrate.endswith('kbits/s'):
+            result['bitrate'] = f"{bitrate[:-7]} kbps"
+        speed = block.get('speed', '')
+        if speed.endswith('x'):
+            result['speed'] = speed
+        size = block.get('total_size', '')
+        if size.isdigit():
+            result['size'] = f"{int(size) // 1024} KB"
     except Exception:
         pass
     return result
 
-def run_ffmpeg_with_progress(cmd: str, progress_callback=None) -> int:
+def run_ffmpeg_with_progress(cmd: List[str], progress_callback=None) -> int:
     """
-    Run FFmpeg command and capture real-time progress.
-    Calls progress_callback(dict) with frame, fps, time, bitrate, speed info.
+    Run FFmpeg argv (see build_ffmpeg_cmd) and capture real-time progress.
+    Calls progress_callback(dict) with frame, fps, time, bitrate, speed info,
+    at most once per pipe read (the newest complete -progress block).
     Returns the exit code.
     """
-    import subprocess
-    
+    # Swap the human -stats line for the key=value progress channel on stdout
+    exe = FFMPEG_PATH if cmd[0] == "ffmpeg" and FFMPEG_PATH else cmd[0]  # skip the PATH walk on exec
+    argv = [exe, *FFMPEG_PROGRESS_ARGS, *(a for a in cmd[1:] if a != "-stats")]
     try:
-        # Run FFmpeg with pipes to capture stderr (where stats are printed)
+        # stderr (warnings/errors) stays on the console; only progress is piped (unbuffered bytes)
         process = subprocess.Popen(
-            cmd,
-            shell=True,
+            argv,
+            stdin=subprocess.DEVNULL,  # ffmpeg would otherwise poll the console for 'q'
             stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            universal_newlines=True,
-            encoding='utf-8',
-            errors='replace'
+            bufsize=0,
         )
         
-        # Read output line by line
-        for line in process.stdout:
-            line = line.strip()
-            if line:
-                # Parse progress info
-                progress_info = parse_ffmpeg_progress(line)
-                if progress_info and progress_callback:
+        # os.read returns whatever is in the pipe, so one syscall usually carries one or
+        # more whole blocks; split into key=value lines, report only the newest block
+        fd = process.stdout.fileno()
+        block, tail = {}, b""
+        while True:
+            chunk = os.read(fd, 4096)
+            if not chunk:
+                break
+            *lines, tail = (tail + chunk).split(b"\n")
+            latest = None
+            for raw in lines:
+                key, _, value = raw.decode("utf-8", "replace").partition('=')
+                if key in _FF_PROGRESS_KEYS:
+                    block[key] = value.strip()
+                elif key == 'progress':  # block terminator: progress=continue|end
+                    latest, block = block, {}
+            if latest is not None and progress_callback:
+                progress_info = parse_ffmpeg_progress(latest)
+                if progress_info:
                     progress_callback(progress_info)
+        process.stdout.close()
         
         # Wait for process to complete
         process.wait()
@@ -722,25 +1085,32 @@ def run_ffmpeg_with_progress(cmd: str, progress_callback=None) -> int:
         return 1
 
 def ensure_unique_path(path: str) -> str:
-    base, ext = os.path.splitext(path)
+    if not os.path.exists(path):
+        return path
+    # One listdir instead of a stat() per taken suffix; normcase for case-insensitive FS
+    folder, name = os.path.split(path)
+    existing = {os.path.normcase(f) for f in os.listdir(folder or ".")}
+    base, ext = os.path.splitext(name)
     n = 1
-    final = path
-    while os.path.exists(final):
-        final = f"{base}_{n}{ext}"
+    while os.path.normcase(f"{base}_{n}{ext}") in existing:
         n += 1
-    return final
+    return os.path.join(folder, f"{base}_{n}{ext}")
 
 # ---------------- Core per-URL processing ----------------
-def process_single_url(page_url: str, out_dir: str, run_now: bool = True, progress_callback=None):
+def process_single_url(page_url: str, out_dir: str, run_now: bool = True, progress_callback=None, driver_pool=None,
+                       browser_manager=None):
     """
     Process a single URL to extract and download HLS video.
-    Creates a fresh Chrome driver for each URL to avoid session issues.
+    Uses a driver from driver_pool when given (reused across the batch),
+    otherwise creates a fresh Chrome driver just for this URL.
     
     Args:
         page_url: URL of the page to process
         out_dir: Output directory for downloaded files
         run_now: Whether to run FFmpeg immediately
         progress_callback: Optional callback function for progress updates
+        driver_pool: Optional FallbackDriverPool for fallback driver reuse
+        browser_manager: Optional PlaywrightBrowserManager owned by the calling thread
     """
     def log_progress(msg):
         """Helper to log progress if callback is provided"""
@@ -759,49 +1129,38 @@ def process_single_url(page_url: str, out_dir: str, run_now: bool = True, progre
     # ===== NEW: Try CDP-based capture first (Playwright or Selenium CDP) =====
     log_progress("🎯 מנסה לכידה באמצעות CDP (מהיר וקל)...")
     try:
-        found_m3u8, master_manifest_url, _ = try_capture_m3u8_via_cdp(page_url, timeout=20)
+        found_m3u8, master_manifest_url, _ = try_capture_m3u8_via_cdp(page_url, timeout=20,
+                                                                     browser_manager=browser_manager)
         
         if found_m3u8:
             log_progress(f"✅ CDP לכד {len(found_m3u8)} קישורי m3u8 בהצלחה!")
         else:
-            log_progress("⚠️ CDP לא מצא m3u8, עובר ל-selenium-wire fallback...")
+            log_progress("⚠️ CDP לא מצא m3u8, עובר ל-Selenium fallback...")
     except Exception as e:
-        log_progress(f"⚠️ CDP נכשל: {e}, עובר ל-selenium-wire fallback...")
+        log_progress(f"⚠️ CDP נכשל: {e}, עובר ל-Selenium fallback...")
     
-    # ===== Fallback to selenium-wire if CDP didn't find anything =====
+    # ===== Fallback to visible Chrome (CDP Network events) if CDP capture didn't find anything =====
     if not found_m3u8:
-        log_progress("🌐 יוצר דפדפן (selenium-wire fallback)...")
-        options = webdriver.ChromeOptions()
-        options.add_argument("--mute-audio")
-        options.add_argument("--autoplay-policy=no-user-gesture-required")
-        options.add_argument("--disable-notifications")
-        options.add_argument("--window-size=1366,900")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        # Use eager page load strategy - don't wait for all resources (images, etc)
-        options.page_load_strategy = 'eager'
-        # Note: NOT using headless mode as it may interfere with video player detection
-        
-        # Add logging to help debug
-        options.add_experimental_option('excludeSwitches', ['enable-logging'])
-
+        log_progress("🌐 יוצר דפדפן (Selenium fallback)...")
         driver = None
+        reusable = False
 
         try:
-            # Create driver with fresh service each time
-            service = Service(ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service, options=options)
-            
-            # Set page load timeout to 60 seconds (sometimes pages are slow)
-            driver.set_page_load_timeout(60)
+            driver = driver_pool.acquire() if driver_pool is not None else create_fallback_driver()
             
             log_progress("📄 טוען דף...")
             try:
+                # Eager strategy - returns at DOMContentLoaded, no need to wait on readyState
                 driver.get(page_url)
-                # Wait for page to be at least interactive (don't need full complete with eager strategy)
-                WebDriverWait(driver, 30).until(lambda d: d.execute_script("return document.readyState") in ["interactive", "complete"])
-                time.sleep(1.5)
+                # Wait for the player to show up instead of a fixed sleep
+                try:
+                    WebDriverWait(driver, 10).until(EC.any_of(
+                        EC.presence_of_element_located((By.CSS_SELECTOR, PLAY_BTN_CSS)),
+                        EC.presence_of_element_located((By.CSS_SELECTOR, ".vjs-big-play-button")),
+                        EC.presence_of_element_located((By.CSS_SELECTOR, 'iframe[src*="kaltura"]')),
+                    ))
+                except TimeoutException:
+                    pass  # No known player element - clicking below still tries everything
             except TimeoutException:
                 log_progress("⚠️ הדף לוקח זמן לטעון, ממשיך בכל זאת...")
                 # Continue anyway - the page might be loaded enough
@@ -826,6 +1185,7 @@ def process_single_url(page_url: str, out_dir: str, run_now: bool = True, progre
             )
             
             log_progress(f"✅ נמצאו {len(found_m3u8)} קישורי m3u8")
+            reusable = True
             
         except Exception as e:
             error_msg = f"Selenium/Load error: {str(e)}"
@@ -837,19 +1197,14 @@ def process_single_url(page_url: str, out_dir: str, run_now: bool = True, progre
                 "details": error_msg,
             }
         finally:
-            # Always close driver in finally block to ensure cleanup
-            if driver:
+            # Always hand back / close driver in finally block to ensure cleanup
+            if driver and driver_pool is not None:
+                # Healthy drivers are reset and reused, broken ones are quit
+                driver_pool.release(driver, reusable=reusable)
+            elif driver:
                 try:
-                    # Clear requests to free memory
-                    if hasattr(driver, 'requests'):
-                        try:
-                            del driver.requests
-                        except Exception:
-                            pass
-                    # Quit the driver
+                    # Quit the driver (blocks until chromedriver has shut down)
                     driver.quit()
-                    # Small delay to ensure cleanup
-                    time.sleep(0.5)
                 except Exception as quit_error:
                     print(f"Warning: Failed to quit driver: {quit_error}")
 
@@ -860,14 +1215,17 @@ def process_single_url(page_url: str, out_dir: str, run_now: bool = True, progre
     for u in found_m3u8:
         log_progress(f"  → {u[:100]}...")  # Print first 100 chars
     
-    # Try to find master manifest
-    master = None
-    for u in found_m3u8:
-        # Look for both cdnapisec and cfvod (both are Kaltura CDNs)
-        if ("cdnapisec.kaltura.com" in u or "cfvod.kaltura.com" in u) and "playmanifest" in u.lower():
-            master = u
-            log_progress(f"✅ נמצא Master Manifest")
-            break
+    # Master manifest: the capture step usually identified it already - scan only if not
+    if master_manifest_url and _is_master(master_manifest_url):
+        master = master_manifest_url
+    else:
+        master = next((u for u in found_m3u8 if _is_master(u)), None)
+    if master:
+        log_progress(f"✅ נמצא Master Manifest")
+
+    # Variant/flavor hosts often differ from the master host - open those
+    # connections while the master playlist is being fetched
+    warm_connections(found_m3u8, referer=referer, skip_url=master)
 
     # Try to extract variants from master
     variants = list_variants_from_master(master, referer=referer) if master else []
@@ -875,32 +1233,42 @@ def process_single_url(page_url: str, out_dir: str, run_now: bool = True, progre
     # If no variants from master, try to find variant playlists directly
     if not variants:
         log_progress("🔍 לא נמצאו variants מ-master, מנסה m3u8s ישירים...")
-        for u in sorted(found_m3u8):
-            # Try all m3u8 files from Kaltura CDN
-            if u.lower().endswith(".m3u8") and ("kaltura.com" in u.lower()):
+        seen = set()
+        for u in found_m3u8:
+            # Try all m3u8 files from Kaltura CDN (ranked by bitrate below - order doesn't matter)
+            # xhr and player bootstrap often fetch the same flavor with different cache-busters
+            key = urlsplit(u)._replace(query="", fragment="").geturl()
+            if _RE_KALTURA_PLAYLIST.search(key) and key not in seen:
+                seen.add(key)
                 log_progress(f"  → מנסה: {u[:80]}...")
                 variants.append({"playlist": u, "bandwidth": 0, "resolution": None, "codecs": None})
 
+    # Only rows[0] is used for ffmpeg - when the master declares BANDWIDTH for every
+    # variant, analyze just the top candidates (second one as a fallback)
+    if master and variants and all(v.get("bandwidth") for v in variants):
+        variants.sort(key=lambda v: v["bandwidth"], reverse=True)
+        variants = variants[:2]
+
     log_progress(f"📊 מנתח {len(variants)} וריאנטי איכות...")
     rows = []
     dur_by_entry = {}
-    for v in variants:
-        try:
-            a = analyze_variant(v["playlist"], referer=referer)
-        except Exception as e:
-            log_progress(f"⚠️ שגיאה בניתוח וריאנט {v['playlist'][:80]}: {e}")
-            # Skip this variant and try the next one
-            continue
+
+    # When the master declares BANDWIDTH, rank by the declared values and skip
+    # HEAD-probing segment sizes - estimate only when nothing is declared at all
+    any_declared = any(v.get("bandwidth") for v in variants)
+
+    def analyze_one(v):
+        """Fetch variant playlist + estimate bitrate, build its table row (runs in a worker thread)"""
+        a = analyze_variant(v["playlist"], referer=referer)
         declared_mbps = (v["bandwidth"] / 1e6) if v.get("bandwidth") else None
-        est_mbps = declared_mbps or estimate_bitrate_mbps(a["segments"], referer=referer, sample_n=3)
+        est_mbps = declared_mbps
+        if est_mbps is None and not any_declared:
+            # One sample is enough for guess_resolution_from_bitrate's coarse buckets
+            # (probed inline - the fan-out is across variants, not segments)
+            est_mbps = estimate_bitrate_mbps(a["segments"], referer=referer)
         resolution = v.get("resolution") or guess_resolution_from_bitrate(est_mbps) or "N/A"
-
         entryId, flavorId = extract_ids(v["playlist"])
-        if entryId and a["total_seconds"]:
-            dur_by_entry.setdefault(entryId, 0)
-            dur_by_entry[entryId] = max(dur_by_entry[entryId], a["total_seconds"])
-
-        rows.append({
+        return {
             "entryId": entryId,
             "flavorId": flavorId,
             "resolution": resolution,
@@ -910,7 +1278,26 @@ def process_single_url(page_url: str, out_dir: str, run_now: bool = True, progre
             "encrypted": "כן" if a["encrypted"] else "לא/לא ידוע",
             "playlist": v["playlist"],
             "sort_mbps": (declared_mbps if declared_mbps is not None else (est_mbps or 0.0))
-        })
+        }
+
+    # Variants are independent requests - analyze them concurrently, keep original order
+    analyzed = {}
+    if variants:
+        with ThreadPoolExecutor(max_workers=min(8, len(variants))) as variant_pool:
+            fut_to_idx = {variant_pool.submit(analyze_one, v): i for i, v in enumerate(variants)}
+            for fut in as_completed(fut_to_idx):
+                i = fut_to_idx[fut]
+                try:
+                    analyzed[i] = fut.result()
+                except Exception as e:
+                    # Skip this variant and try the next one
+                    log_progress(f"⚠️ שגיאה בניתוח וריאנט {variants[i]['playlist'][:80]}: {e}")
+
+    for i in sorted(analyzed):
+        row = analyzed[i]
+        if row["entryId"] and row["duration_seconds"]:
+            dur_by_entry[row["entryId"]] = max(dur_by_entry.get(row["entryId"], 0), row["duration_seconds"])
+        rows.append(row)
 
     if dur_by_entry:
         best_entry = max(dur_by_entry.items(), key=lambda kv: kv[1])[0]
@@ -944,7 +1331,7 @@ def process_single_url(page_url: str, out_dir: str, run_now: bool = True, progre
         if top.get("flavorId"):
             base += f"_{top['flavorId']}"
         if top.get("resolution") and "N/A" not in top["resolution"]:
-            res_clean = re.sub(r"[^\dxp]", "", top["resolution"])
+            res_clean = _RE_RES_CLEAN.sub("", top["resolution"])
             if res_clean:
                 base += f"_{res_clean}"
 
@@ -952,8 +1339,9 @@ def process_single_url(page_url: str, out_dir: str, run_now: bool = True, progre
     os.makedirs(out_dir, exist_ok=True)
     out_path = ensure_unique_path(os.path.join(out_dir, out_name))
 
-    ff_cmd = build_ffmpeg_cmd(m3u8_url=top["playlist"], out_mp4=out_path, referer=page_url, ua=UA)
-    has_ffmpeg = shutil.which("ffmpeg") is not None
+    ff_argv = build_ffmpeg_cmd(m3u8_url=top["playlist"], out_mp4=out_path, referer=page_url, ua=UA)
+    ff_cmd = format_ffmpeg_cmd(ff_argv)
+    has_ffmpeg = FFMPEG_PATH is not None
 
     # Optionally run ffmpeg now
     ran = False
@@ -979,7 +1367,7 @@ def process_single_url(page_url: str, out_dir: str, run_now: bool = True, progre
                 log_progress(f"⬇️ {status_msg}")
         
         try:
-            retcode = run_ffmpeg_with_progress(ff_cmd, progress_callback=ffmpeg_progress_cb)
+            retcode = run_ffmpeg_with_progress(ff_argv, progress_callback=ffmpeg_progress_cb)
             ran = True
             log_progress(f"✅ FFmpeg הסתיים עם קוד {retcode}")
         except Exception as e:
@@ -1056,27 +1444,30 @@ def run_batch():
         return jsonify({"ok": False, "error": "לא סופקו קישורים."}), 400
 
     def generate():
+        # Per-URL worker chatter goes to DEBUG - print() serialized the workers on the stdout lock
+        logger = logging.getLogger(__name__)
         q = queue.Queue()
+        _WORKER_DONE = object()
 
         def make_progress_cb(idx):
             def _cb(msg: dict):
                 q.put({"index": idx, "type": "progress", **msg})
             return _cb
 
-        def worker(idx, url):
+        def worker(idx, url, browser_manager):
             # title via HTTP for fast UI fill
             title = extract_title_via_http(url) or "(ללא כותרת)"
             q.put({"index": idx, "type": "title", "title": title, "url": url})
             
             # Try yt-dlp first (fast, generic)
             try:
-                print(f"[Worker {idx}] מנסה yt-dlp עבור: {url}")
+                logger.debug("[Worker %s] מנסה yt-dlp עבור: %s", idx, url)
                 res = download_with_ytdlp(url, out_dir=out_dir, progress_cb=make_progress_cb(idx))
                 q.put({"index": idx, "type": "result", "emoji": "✅", "status": "ok", **res, "url": url})
-                print(f"[Worker {idx}] ✅ הצלחה עם yt-dlp")
+                logger.debug("[Worker %s] ✅ הצלחה עם yt-dlp", idx)
             except Exception as yt_error:
-                print(f"[Worker {idx}] ❌ yt-dlp נכשל: {yt_error}")
-                print(f"[Worker {idx}] 🔄 מנסה Selenium כ-fallback...")
+                logger.debug("[Worker %s] ❌ yt-dlp נכשל: %s", idx, yt_error)
+                logger.debug("[Worker %s] 🔄 מנסה Selenium כ-fallback...", idx)
                 q.put({"index": idx, "type": "progress", "status": "fallback", "percent": 0, "filename": "מנסה Selenium..."})
                 
                 # Fallback to Selenium (slower but works for Kaltura/13tv)
@@ -1084,38 +1475,59 @@ def run_batch():
                     def selenium_progress(msg):
                         q.put({"index": idx, "type": "progress", "status": "selenium", "percent": None, "filename": msg})
                     
-                    res = process_single_url(url, out_dir=out_dir, run_now=run_now, progress_callback=selenium_progress)
+                    res = process_single_url(url, out_dir=out_dir, run_now=run_now,
+                                             progress_callback=selenium_progress, driver_pool=driver_pool,
+                                             browser_manager=browser_manager)
                     if res.get("status") == "ok":
                         q.put({"index": idx, "type": "result", "emoji": "✅", **res, "url": url})
-                        print(f"[Worker {idx}] ✅ הצלחה עם Selenium")
+                        logger.debug("[Worker %s] ✅ הצלחה עם Selenium", idx)
                     else:
                         q.put({"index": idx, "type": "result", "emoji": "❌", **res, "url": url})
-                        print(f"[Worker {idx}] ❌ Selenium נכשל")
+                        logger.debug("[Worker %s] ❌ Selenium נכשל", idx)
                 except Exception as selenium_error:
-                    print(f"[Worker {idx}] ❌ גם Selenium נכשל: {selenium_error}")
+                    logger.warning("[Worker %s] ❌ גם Selenium נכשל: %s", idx, selenium_error)
                     error_msg = f"yt-dlp: {str(yt_error)}\n\nSelenium fallback: {str(selenium_error)}"
                     q.put({"index": idx, "type": "result", "emoji": "❌", "status": "error", "details": error_msg, "url": url, "title": title})
 
-        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as ex:
-            futures = []
-            for idx, u in enumerate(urls):
-                futures.append(ex.submit(worker, idx, u))
+        pending = queue.SimpleQueue()
+        for item in enumerate(urls):
+            pending.put(item)
 
-            # While any worker is alive, drain queue and yield SSE
-            alive = True
+        def worker_loop():
+            # Playwright's sync API is bound to the thread that started it, so each
+            # worker thread owns one headless browser (started lazily) for the whole
+            # batch instead of launching Chromium per URL.
+            manager = PlaywrightBrowserManager() if PLAYWRIGHT_ENABLED else None
+            try:
+                while True:
+                    try:
+                        idx, url = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    try:
+                        worker(idx, url, manager)
+                    except Exception as e:
+                        q.put({"index": idx, "type": "result", "emoji": "❌", "status": "error", "details": str(e), "url": url})
+            finally:
+                if manager is not None:
+                    manager.stop()
+
+        # Selenium fallback drivers are shared across the batch (one per active worker)
+        workers = max(1, min(concurrency, MAX_BATCH_WORKERS, len(urls)))
+        with FallbackDriverPool() as driver_pool, ThreadPoolExecutor(max_workers=workers) as ex:
+            futures = [ex.submit(worker_loop) for _ in range(workers)]
+            # Each finished worker posts a sentinel after its last item (FIFO), so a
+            # blocking get() sees every event and no 200ms polling is needed
+            for f in futures:
+                f.add_done_callback(lambda _f: q.put(_WORKER_DONE))
+
+            alive = len(futures)  # O(1) liveness check instead of scanning the futures
             while alive:
-                try:
-                    item = q.get(timeout=0.2)
-                    yield f"data: {json.dumps(item)}\n\n"
-                except Exception:
-                    pass
-                # Check if all futures done
-                alive = any(not f.done() for f in futures)
-
-        # flush remaining
-        while not q.empty():
-            item = q.get()
-            yield f"data: {json.dumps(item)}\n\n"
+                item = q.get()
+                if item is _WORKER_DONE:
+                    alive -= 1
+                    continue
+                yield f"data: {json.dumps(item)}\n\n"
 
         yield f"data: {json.dumps({'type': 'done'})}\n\n"
 
@@ -20,24 +20,35 @@ Author: AI Assistant
 License: MIT
 """
 
+from __future__ import annotations  # Playwright types are only imported for type checking
+
 import time
 import logging
+import queue
 import re
-from typing import List, Optional, Dict, Any
+import os
+import json
+import shutil
+import tempfile
+import subprocess
+import urllib.request
+import importlib.util
+from typing import TYPE_CHECKING, List, Optional, Dict, Any
 from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
-try:
-    from playwright.sync_api import sync_playwright, Browser, Page, Response, Error as PlaywrightError
-    PLAYWRIGHT_AVAILABLE = True
-except ImportError:
-    PLAYWRIGHT_AVAILABLE = False
+# playwright.sync_api costs ~50ms to import, so it is loaded on first use
+# (_load_playwright) rather than whenever this module is imported
+PLAYWRIGHT_AVAILABLE = importlib.util.find_spec('playwright') is not None
+if TYPE_CHECKING:
+    from playwright.sync_api import Browser, Page, Response
 
 from m3u8_sniffer_utils import (
     M3U8Info,
     is_m3u8_url,
     is_hls_content_type,
     is_kaltura_master_manifest,
-    analyze_m3u8_url,
+    analyze_if_new,
     filter_and_prioritize_m3u8s,
 )
 
@@ -61,10 +72,31 @@ BLOCKED_URL_PATTERNS = [
     r'.*\.facebook\.com/tr.*',
     r'.*\.adnxs\.com.*',
     r'.*\.advertising\.com.*',
+    r'^[^?]*\.(?:ts|m4s|mp4)(?:$|\?)',  # media segments - only the playlists are needed
 ]
 
 BLOCKED_URL_REGEX = re.compile('|'.join(BLOCKED_URL_PATTERNS), re.IGNORECASE)
 
+# The same blocklist as Network.setBlockedURLs wildcards, filtered natively by
+# Chromium (no Python round trip per request). CDP can't block by resource type,
+# so images/fonts/stylesheets are matched by extension instead. Media segments are
+# dropped too: the player still requests its playlists first, and those are all
+# the capture looks at.
+BLOCKED_URL_GLOBS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.css',
+    '*.ts', '*.m4s', '*.mp4',  # no '?' forms: it's a wildcard here and would hit '/a.mp4/index.m3u8'
+    '*/thumbnail/*',  # Kaltura thumbnail API - images without an extension
+    '*.doubleclick.net*',
+    '*.googlesyndication.com*',
+    '*.google-analytics.com*',
+    '*.googletagmanager.com*',
+    '*.facebook.net*',
+    '*.facebook.com/tr*',
+    '*.adnxs.com*',
+    '*.advertising.com*',
+]
+
 # Default browser arguments for efficiency
 DEFAULT_BROWSER_ARGS = [
     '--no-sandbox',
@@ -86,8 +118,61 @@ DEFAULT_BROWSER_ARGS = [
     '--metrics-recording-only',
     '--mute-audio',
     '--autoplay-policy=no-user-gesture-required',
+    '--blink-settings=imagesEnabled=false',
 ]
 
+# Play buttons, most specific first; joined into one CSS selector group
+PLAY_BUTTON_SELECTORS = [
+    'button.playkit-pre-playback-play-button',
+    'button.vjs-big-play-button',
+    'button[title="Play"]',
+    'button[aria-label*="Play"]',
+    'button[aria-label*="נגן"]',
+    '.play-button',
+    '[class*="play-button"]',
+    '[id*="play-button"]',
+]
+PLAY_BUTTON_SELECTOR = ", ".join(PLAY_BUTTON_SELECTORS)
+
+# arguments: CSS selector group; clicks the first visible match
+CLICK_FIRST_VISIBLE_JS = """
+    (selector) => {
+        for (const el of document.querySelectorAll(selector)) {
+            if (el.offsetWidth || el.offsetHeight || el.getClientRects().length) {
+                try { el.click(); return true; } catch (e) {}
+            }
+        }
+        return false;
+    }
+"""
+
+# In-page autoplay nudge, re-run while waiting until the first m3u8 shows up.
+# Only pre-playback overlays (hidden once playing) are clicked, so repeating it
+# can't toggle a playing video back to paused; video.play() is idempotent.
+AUTOPLAY_JS = """
+    () => {
+        let clicked = false;
+        const overlay = document.querySelector(
+            'button.playkit-pre-playback-play-button, .vjs-big-play-button');
+        if (overlay && (overlay.offsetWidth || overlay.offsetHeight)) {
+            try { overlay.click(); clicked = true; } catch (e) {}
+        }
+        for (const video of document.getElementsByTagName('video')) {
+            try { video.muted = true; video.play(); } catch (e) {}
+        }
+        return clicked;
+    }
+"""
+AUTOPLAY_INTERVAL = 0.5  # seconds between nudges
+# After a master manifest, wait this long for a variant playlist - only while none is in yet
+MASTER_GRACE_PERIOD = 0.2
+
+def _load_playwright():
+    """Import the Playwright sync API into this module's namespace (no-op once loaded)."""
+    global sync_playwright, PlaywrightError, PlaywrightTimeoutError
+    from playwright.sync_api import sync_playwright, Error as PlaywrightError
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
 # ============================================================================
 # Browser Manager
 # ============================================================================
@@ -99,22 +184,27 @@ class PlaywrightBrowserManager:
     Allows browser instance reuse across multiple URLs for efficiency.
     """
     
-    def __init__(self, headless: bool = True, browser_args: Optional[List[str]] = None):
+    def __init__(self, headless: bool = True, browser_args: Optional[List[str]] = None,
+                 cdp_endpoint: Optional[str] = None):
         """
         Initialize browser manager.
         
         Args:
             headless: Run browser in headless mode
             browser_args: Custom browser arguments (defaults to DEFAULT_BROWSER_ARGS)
+            cdp_endpoint: Attach to an already running Chromium (e.g. SharedCDPEndpoint.ws_url)
+                instead of launching one; headless/browser_args are then ignored
         """
         if not PLAYWRIGHT_AVAILABLE:
             raise ImportError(
                 "Playwright is not installed. "
                 "Install with: pip install playwright && playwright install chromium"
             )
+        _load_playwright()
         
         self.headless = headless
         self.browser_args = browser_args or DEFAULT_BROWSER_ARGS
+        self.cdp_endpoint = cdp_endpoint
         self.playwright = None
         self.browser = None
         
@@ -130,11 +220,15 @@ class PlaywrightBrowserManager:
         self.playwright = sync_playwright().start()
         
         try:
-            self.browser = self.playwright.chromium.launch(
-                headless=self.headless,
-                args=self.browser_args
-            )
-            logger.info("✅ Playwright browser started successfully")
+            if self.cdp_endpoint:
+                self.browser = self.playwright.chromium.connect_over_cdp(self.cdp_endpoint)
+                logger.info("✅ Connected to shared browser over CDP")
+            else:
+                self.browser = self.playwright.chromium.launch(
+                    headless=self.headless,
+                    args=self.browser_args
+                )
+                logger.info("✅ Playwright browser started successfully")
         except Exception as e:
             logger.error(f"❌ Failed to start browser: {e}")
             if self.playwright:
@@ -146,7 +240,7 @@ class PlaywrightBrowserManager:
         """Stop the Playwright browser."""
         if self.browser:
             try:
-                self.browser.close()
+                self.browser.close()  # over CDP this only disconnects; the shared process stays up
                 logger.info("Browser closed")
             except Exception as e:
                 logger.warning(f"Error closing browser: {e}")
@@ -163,7 +257,12 @@ class PlaywrightBrowserManager:
                 self.playwright = None
     
     def get_browser(self) -> Browser:
-        """Get the browser instance, starting if necessary."""
+        """Get the browser instance, (re)starting it if necessary."""
+        if self.browser is not None and not self.browser.is_connected():
+            # Chromium crashed or the CDP connection dropped - a long-lived manager
+            # (one per batch worker) would otherwise fail every later URL
+            logger.warning("Browser disconnected, restarting")
+            self.stop()
         if self.browser is None:
             self.start()
         return self.browser
@@ -171,18 +270,21 @@ class PlaywrightBrowserManager:
     @contextmanager
     def new_page(self, **kwargs):
         """
-        Context manager for creating a new page.
+        Context manager for creating a new page in its own browser context.
+        
+        Each page gets fresh cookies/storage while sharing the browser process,
+        so reusing one manager across URLs only skips the Chromium startup.
         
         Yields:
             Page object
         """
         browser = self.get_browser()
-        page = browser.new_page(**kwargs)
+        context = browser.new_context(**kwargs)
         try:
-            yield page
+            yield context.new_page()
         finally:
             try:
-                page.close()
+                context.close()  # closes its pages too
             except Exception as e:
                 logger.warning(f"Error closing page: {e}")
     
@@ -195,6 +297,107 @@ class PlaywrightBrowserManager:
         """Support context manager protocol."""
         self.stop()
 
+class SharedCDPEndpoint:
+    """
+    One long-lived headless Chromium that many capture workers attach to over CDP.
+    
+    Each PlaywrightBrowserManager(cdp_endpoint=endpoint.ws_url) connects to it
+    instead of launching its own browser, so N workers share one set of browser
+    processes while every capture still gets its own isolated context.
+    """
+    
+    def __init__(self, executable: Optional[str] = None, port: int = 9222,
+                 browser_args: Optional[List[str]] = None, startup_timeout: float = 15.0):
+        """
+        Args:
+            executable: Chromium/Chrome binary (defaults to Playwright's bundled Chromium)
+            port: Remote debugging port
+            browser_args: Extra browser arguments (defaults to DEFAULT_BROWSER_ARGS)
+            startup_timeout: Seconds to wait for the DevTools endpoint
+        """
+        self.executable = executable
+        self.port = port
+        self.browser_args = browser_args or DEFAULT_BROWSER_ARGS
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.user_data_dir = None
+        self.ws_url = None
+    
+    def start(self) -> str:
+        """Launch Chromium and return its browser WebSocket URL."""
+        if self.process is not None:
+            return self.ws_url
+        
+        executable = self.executable or _find_chromium()
+        if not executable:
+            raise RuntimeError("No Chromium executable found (run: playwright install chromium)")
+        
+        self.user_data_dir = tempfile.mkdtemp(prefix="m3u8_cdp_")
+        logger.info(f"Starting shared Chromium on port {self.port}...")
+        self.process = subprocess.Popen(
+            [executable, '--headless=new', f'--remote-debugging-port={self.port}',
+             f'--user-data-dir={self.user_data_dir}', *self.browser_args, 'about:blank'],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        
+        version_url = f"http://127.0.0.1:{self.port}/json/version"
+        deadline = time.time() + self.startup_timeout
+        while True:
+            try:
+                with urllib.request.urlopen(version_url, timeout=1) as resp:
+                    self.ws_url = json.load(resp)['webSocketDebuggerUrl']
+                break
+            except (OSError, ValueError, KeyError):
+                if self.process.poll() is not None or time.time() > deadline:
+                    self.stop()
+                    raise RuntimeError(f"Chromium DevTools endpoint did not come up on port {self.port}")
+                time.sleep(0.1)
+        
+        logger.info(f"✅ Shared Chromium ready: {self.ws_url}")
+        return self.ws_url
+    
+    def stop(self):
+        """Terminate the shared Chromium and remove its profile directory."""
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+            self.ws_url = None
+        if self.user_data_dir:
+            shutil.rmtree(self.user_data_dir, ignore_errors=True)
+            self.user_data_dir = None
+    
+    def __enter__(self):
+        self.start()
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def _find_chromium() -> Optional[str]:
+    """Playwright's bundled Chromium if installed, else a system Chrome/Chromium."""
+    if PLAYWRIGHT_AVAILABLE:
+        try:
+            _load_playwright()
+            with sync_playwright() as p:
+                path = p.chromium.executable_path
+            if path and os.path.exists(path):
+                return path
+        except Exception as e:
+            logger.debug(f"Bundled Chromium not available: {e}")
+    for name in ('chromium', 'chromium-browser', 'google-chrome', 'chrome'):
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
 # ============================================================================
 # M3U8 Capture
 # ============================================================================
@@ -246,6 +449,7 @@ def capture_m3u8_via_playwright(
     logger.info(f"🎬 Starting m3u8 capture for: {url}")
     
     found_m3u8s: List[M3U8Info] = []
+    seen_urls = set()
     master_found_time = None
     
     # Use provided browser manager or create temporary one
@@ -272,10 +476,14 @@ def capture_m3u8_via_playwright(
                     if status < 200 or status >= 400:
                         return
                     
+                    # Chromium can report the same URL more than once; analyze it once
+                    if response_url in seen_urls:
+                        return
+                    
                     # Get headers safely
                     try:
                         headers = response.headers
-                        content_type = headers.get('content-type', '').lower()
+                        content_type = headers.get('content-type', '')
                     except Exception:
                         headers = {}
                         content_type = ''
@@ -284,7 +492,9 @@ def capture_m3u8_via_playwright(
                     is_m3u8_by_url = is_m3u8_url(response_url)
                     is_m3u8_by_content = is_hls_content_type(content_type)
                     
-                    if is_m3u8_by_url or is_m3u8_by_content:
+                    if not (is_m3u8_by_url or is_m3u8_by_content):
+                        seen_urls.add(response_url)
+                    else:
                         # Get initiator if available
                         try:
                             request = response.request
@@ -292,14 +502,17 @@ def capture_m3u8_via_playwright(
                         except Exception:
                             initiator = None
                         
-                        # Analyze and store
-                        m3u8_info = analyze_m3u8_url(
+                        # Analyze and store (records response_url in seen_urls)
+                        m3u8_info = analyze_if_new(
                             url=response_url,
+                            seen=seen_urls,
                             timestamp=time.time(),
                             response_headers=dict(headers),
                             status_code=status,
                             initiator=initiator
                         )
+                        if m3u8_info is None:
+                            return
                         
                         found_m3u8s.append(m3u8_info)
                         
@@ -318,28 +531,9 @@ def capture_m3u8_via_playwright(
                 except Exception as e:
                     logger.debug(f"Error in response handler: {e}")
             
-            # Set up route handler for resource blocking
+            # Set up resource blocking
             if block_resources:
-                def on_route(route):
-                    """Block unnecessary resources."""
-                    request = route.request
-                    resource_type = request.resource_type
-                    request_url = request.url
-                    
-                    # Block by resource type
-                    if resource_type in BLOCKED_RESOURCE_TYPES:
-                        route.abort()
-                        return
-                    
-                    # Block by URL pattern (ads, trackers)
-                    if BLOCKED_URL_REGEX.search(request_url):
-                        route.abort()
-                        return
-                    
-                    # Continue with request
-                    route.continue_()
-                
-                page.route('**/*', on_route)
+                _block_resources(page)
             
             # Attach response listener
             page.on('response', on_response)
@@ -366,17 +560,47 @@ def capture_m3u8_via_playwright(
             
             # Wait for additional network activity
             logger.info(f"⏳ Waiting {wait_after_load}s for additional network activity...")
-            elapsed = 0.0
-            check_interval = 0.2
+            deadline = time.time() + wait_after_load
+            next_nudge = time.time() + AUTOPLAY_INTERVAL
             
-            while elapsed < wait_after_load:
-                # Early exit if master manifest found and grace period passed
-                if master_found_time and (time.time() - master_found_time > 1.0):
+            while True:
+                now = time.time()
+                # Early exit once a master manifest is in; brief grace only if no variant yet
+                if master_found_time:
+                    grace = 0.0
+                    if all(m.is_master for m in found_m3u8s):
+                        grace = master_found_time + MASTER_GRACE_PERIOD - now
+                    if grace > 0:
+                        try:
+                            page.wait_for_timeout(grace * 1000)
+                        except PlaywrightError:
+                            pass  # page gone - keep what was captured
                     logger.info("🚀 Master manifest found, exiting early!")
                     break
+                if now >= deadline:
+                    break
+                
+                # Keep nudging the player (page + frames, one evaluate each) until
+                # playback requests its first playlist
+                nudging = click_play_button and not found_m3u8s
+                if nudging and now >= next_nudge:
+                    _autoplay(page)
+                    next_nudge = time.time() + AUTOPLAY_INTERVAL
                 
-                time.sleep(check_interval)
-                elapsed += check_interval
+                # Block inside Playwright (time.sleep would stall event dispatch) until
+                # on_response records a master, the next nudge, or the deadline
+                until = min(deadline, next_nudge) if nudging else deadline
+                try:
+                    page.wait_for_event(
+                        'response',
+                        predicate=lambda _: master_found_time is not None,
+                        timeout=max(1.0, (until - time.time()) * 1000),
+                    )
+                except PlaywrightTimeoutError:
+                    pass  # re-check deadline / nudge
+                except PlaywrightError as e:
+                    logger.debug(f"Stopped waiting for responses: {e}")
+                    break  # page closed/crashed
             
             logger.info(f"✅ Capture complete. Found {len(found_m3u8s)} m3u8 URLs")
     
@@ -388,6 +612,59 @@ def capture_m3u8_via_playwright(
     return found_m3u8s
 
 
+def _block_resources(page: Page):
+    """
+    Block images/fonts/stylesheets and ad/tracker hosts for a page.
+    
+    Uses Network.setBlockedURLs on a CDP session so Chromium drops them itself.
+    A page session doesn't reach cross-origin iframes (e.g. the Kaltura player
+    on cdnapisec.kaltura.com), which run out of process, so each such frame gets
+    its own session with the same blocklist as it attaches or navigates. Falls
+    back to a per-request route handler (which Playwright applies to every
+    frame) when a CDP session can't be opened.
+    """
+    def on_route(route):
+        """Block unnecessary resources."""
+        request = route.request
+        if (request.resource_type in BLOCKED_RESOURCE_TYPES
+                or BLOCKED_URL_REGEX.search(request.url)):
+            route.abort()
+        else:
+            route.continue_()
+    
+    def block_via_cdp(target):
+        cdp = page.context.new_cdp_session(target)
+        cdp.send('Network.enable')
+        cdp.send('Network.setBlockedURLs', {'urls': BLOCKED_URL_GLOBS})
+    
+    try:
+        block_via_cdp(page)
+    except PlaywrightError as e:
+        logger.debug(f"CDP blocking unavailable, routing instead: {e}")
+        page.route('**/*', on_route)
+        return
+    
+    routed = False
+    
+    def on_frame(frame):
+        """Give an out-of-process child frame its own blocklist session."""
+        nonlocal routed
+        if routed or frame is page.main_frame:
+            return
+        try:
+            block_via_cdp(frame)
+        except PlaywrightError as e:
+            if 'separate CDP session' in str(e):
+                return  # same-process frame - already covered by the page session
+            logger.debug(f"CDP blocking unavailable for frame, routing instead: {e}")
+            routed = True
+            page.route('**/*', on_route)
+    
+    # A frame only moves out of process when it navigates cross-origin
+    page.on('frameattached', on_frame)
+    page.on('framenavigated', on_frame)
+
+
 def _click_play_buttons(page: Page):
     """
     Attempt to click play buttons on the page.
@@ -397,32 +674,15 @@ def _click_play_buttons(page: Page):
     """
     logger.debug("🎬 Attempting to click play buttons...")
     
-    # Common play button selectors
-    play_button_selectors = [
-        'button.playkit-pre-playback-play-button',
-        'button.vjs-big-play-button',
-        'button[title="Play"]',
-        'button[aria-label*="Play"]',
-        'button[aria-label*="נגן"]',
-        '.play-button',
-        '[class*="play-button"]',
-        '[id*="play-button"]',
-    ]
-    
-    clicked = False
-    
-    for selector in play_button_selectors:
-        try:
-            # Try to click with short timeout
-            element = page.locator(selector).first
-            if element.is_visible(timeout=500):
-                element.click(timeout=500)
-                clicked = True
-                logger.debug(f"✅ Clicked play button: {selector}")
-                time.sleep(0.5)  # Brief wait after click
-                break
-        except Exception:
-            continue
+    # One combined selector, narrowed to visible matches, instead of probing each selector
+    try:
+        buttons = page.locator(f"{PLAY_BUTTON_SELECTOR} >> visible=true")
+        if buttons.count():
+            buttons.first.click(timeout=500)
+            logger.debug("✅ Clicked play button")
+            page.wait_for_timeout(100)  # Brief wait after click (keeps events flowing)
+    except Exception:
+        pass
     
     # Try to start video elements directly via JavaScript
     try:
@@ -444,28 +704,18 @@ def _click_play_buttons(page: Page):
     # Handle iframes
     try:
         for frame in page.frames:
-            if frame.url != 'about:blank':
+            if frame.url != 'about:blank' and frame is not page.main_frame:
                 _click_play_buttons_in_frame(frame)
     except Exception:
         pass
 
 
 def _click_play_buttons_in_frame(frame):
-    """Try clicking play buttons in a frame."""
-    play_button_selectors = [
-        'button.playkit-pre-playback-play-button',
-        'button.vjs-big-play-button',
-        'button[title="Play"]',
-    ]
-    
-    for selector in play_button_selectors:
-        try:
-            element = frame.locator(selector).first
-            if element.is_visible(timeout=300):
-                element.click(timeout=300)
-                break
-        except Exception:
-            continue
+    """Click the first visible play button in a frame (one evaluate round-trip)."""
+    try:
+        frame.evaluate(CLICK_FIRST_VISIBLE_JS, PLAY_BUTTON_SELECTOR)
+    except Exception:
+        pass
 
 
 # ============================================================================
@@ -476,59 +726,74 @@ def capture_m3u8_from_urls(
     urls: List[str],
     timeout: int = 20,
     wait_after_load: float = 3.0,
-    reuse_browser: bool = True
+    reuse_browser: bool = True,
+    concurrency: int = 4,
+    cdp_endpoint: Optional[str] = None
 ) -> Dict[str, List[M3U8Info]]:
     """
     Capture m3u8 URLs from multiple pages.
     
+    Pages are captured concurrently by up to `concurrency` worker threads, so
+    their navigation/network waits overlap. Playwright's sync objects are bound
+    to the thread that created them, so with reuse_browser each worker owns one
+    browser for all the URLs it picks up (each URL gets its own context). With
+    cdp_endpoint the workers all attach to that one browser instead.
+    
     Args:
         urls: List of page URLs to process
         timeout: Navigation timeout per URL
         wait_after_load: Wait time after page load
         reuse_browser: Whether to reuse browser instance (recommended)
+        concurrency: Maximum number of pages captured at the same time
+        cdp_endpoint: WebSocket URL of a shared browser (see SharedCDPEndpoint)
         
     Returns:
-        Dictionary mapping URL -> List[M3U8Info]
+        Dictionary mapping URL -> List[M3U8Info] (in input order)
         
     Example:
         >>> urls = ["https://example.com/video1", "https://example.com/video2"]
         >>> results = capture_m3u8_from_urls(urls, reuse_browser=True)
         >>> for url, m3u8s in results.items():
         ...     print(f"{url}: {len(m3u8s)} m3u8s found")
+        >>> 
+        >>> # Ten workers, one Chromium
+        >>> with SharedCDPEndpoint() as endpoint:
+        ...     results = capture_m3u8_from_urls(urls, concurrency=10, cdp_endpoint=endpoint.ws_url)
     """
-    results = {}
+    results = {url: [] for url in urls}
+    pending = queue.SimpleQueue()
+    for url in urls:
+        pending.put(url)
     
-    if reuse_browser:
-        # Reuse browser instance for efficiency
-        logger.info(f"🚀 Processing {len(urls)} URLs with browser reuse")
-        with PlaywrightBrowserManager() as manager:
-            for url in urls:
+    def worker_loop():
+        # Started lazily; over CDP a connection is cheap, so always keep one per worker
+        manager = (PlaywrightBrowserManager(cdp_endpoint=cdp_endpoint)
+                   if reuse_browser or cdp_endpoint else None)
+        try:
+            while True:
+                try:
+                    url = pending.get_nowait()
+                except queue.Empty:
+                    return
                 try:
-                    m3u8s = capture_m3u8_via_playwright(
+                    results[url] = capture_m3u8_via_playwright(
                         url,
                         browser_manager=manager,
                         timeout=timeout,
                         wait_after_load=wait_after_load
                     )
-                    results[url] = m3u8s
                 except Exception as e:
                     logger.error(f"❌ Error processing {url}: {e}")
-                    results[url] = []
-    else:
-        # Create new browser for each URL
-        logger.info(f"🚀 Processing {len(urls)} URLs with fresh browsers")
-        for url in urls:
-            try:
-                m3u8s = capture_m3u8_via_playwright(
-                    url,
-                    browser_manager=None,
-                    timeout=timeout,
-                    wait_after_load=wait_after_load
-                )
-                results[url] = m3u8s
-            except Exception as e:
-                logger.error(f"❌ Error processing {url}: {e}")
-                results[url] = []
+        finally:
+            if manager is not None:
+                manager.stop()
+    
+    workers = max(1, min(concurrency, len(urls)))
+    mode = "shared CDP browser" if cdp_endpoint else ("browser reuse" if reuse_browser else "fresh browsers")
+    logger.info(f"🚀 Processing {len(urls)} URLs with {mode} ({workers} workers)")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(worker_loop) for _ in range(workers)]:
+            future.result()
     
     return results
 
@@ -576,34 +841,9 @@ def capture_m3u8_via_cdp(
         wait_after_load=3.0
     )
     
-    # Convert M3U8Info objects to dictionaries
-    results = []
-    for info in m3u8_infos:
-        results.append({
-            'url': info.url,
-            'timestamp': info.timestamp,
-            'initiator': info.initiator,
-            'response_headers': info.response_headers,
-            'status': info.status_code,
-            'is_master': info.is_master,
-            'is_kaltura': info.is_kaltura,
-            'entry_id': info.entry_id,
-            'flavor_id': info.flavor_id,
-        })
-    
     # Sort by priority
     prioritized = filter_and_prioritize_m3u8s(m3u8_infos)
     
     # Return as dictionaries in prioritized order
-    return [{
-        'url': info.url,
-        'timestamp': info.timestamp,
-        'initiator': info.initiator,
-        'response_headers': info.response_headers,
-        'status': info.status_code,
-        'is_master': info.is_master,
-        'is_kaltura': info.is_kaltura,
-        'entry_id': info.entry_id,
-        'flavor_id': info.flavor_id,
-    } for info in prioritized]
+    return [info.to_dict() for info in prioritized]
 
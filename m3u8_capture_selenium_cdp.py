@@ -12,7 +12,7 @@ Security features:
 Performance features:
 - CDP Network events listening
 - Browser instance reuse
-- Efficient log parsing
+- Push-based CDP event stream (performance-log polling as a fallback)
 
 Author: AI Assistant
 License: MIT
@@ -20,25 +20,40 @@ License: MIT
 
 import time
 import json
+import queue
+import socket
 import logging
+import itertools
+import threading
+import importlib.util
+import urllib.request
 from typing import List, Optional, Dict, Any
 from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     from selenium import webdriver
     from selenium.webdriver.chrome.service import Service
     from selenium.webdriver.chrome.options import Options as ChromeOptions
+    from selenium.webdriver.common.by import By
     from selenium.common.exceptions import WebDriverException
-    from webdriver_manager.chrome import ChromeDriverManager
-    SELENIUM_AVAILABLE = True
+    # webdriver_manager costs ~60ms to import and is only needed to resolve the
+    # driver binary once, so it is imported in _get_driver_path
+    SELENIUM_AVAILABLE = importlib.util.find_spec('webdriver_manager') is not None
 except ImportError:
     SELENIUM_AVAILABLE = False
 
+try:
+    import websocket  # websocket-client, installed with selenium
+    WEBSOCKET_AVAILABLE = True
+except ImportError:
+    WEBSOCKET_AVAILABLE = False
+
 from m3u8_sniffer_utils import (
     M3U8Info,
     is_m3u8_url,
     is_hls_content_type,
-    analyze_m3u8_url,
+    analyze_if_new,
     filter_and_prioritize_m3u8s,
 )
 
@@ -61,8 +76,44 @@ DEFAULT_CHROME_ARGS = [
     '--mute-audio',
     '--autoplay-policy=no-user-gesture-required',
     '--disable-notifications',
+    '--blink-settings=imagesEnabled=false',
 ]
 
+# Network.setBlockedURLs wildcards: fonts/stylesheets and media segments (only the
+# playlists are needed). No '?' forms - it's a wildcard and would hit '/a.mp4/index.m3u8'.
+BLOCKED_URL_GLOBS = [
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.css',
+    '*.ts', '*.m4s', '*.mp4',
+]
+
+# Play buttons: one CSS selector group (a single find_elements round-trip) + XPath catch-all
+PLAY_BUTTON_CSS = ", ".join([
+    'button.playkit-pre-playback-play-button',
+    'button.vjs-big-play-button',
+    'button[title="Play"]',
+    'button[aria-label*="Play"]',
+    'button[aria-label*="נגן"]',
+    '.play-button',
+])
+PLAY_BUTTON_XPATH = '//button[contains(@class, "play")]'
+
+# After a master manifest, wait this long for a variant playlist - only while none is in yet
+MASTER_GRACE_PERIOD = 0.2
+
+_CHROMEDRIVER_PATH: Optional[str] = None
+_CHROMEDRIVER_LOCK = threading.Lock()
+
+
+def _get_driver_path() -> str:
+    """Resolve the ChromeDriver binary once per process (install() does filesystem + network checks)."""
+    global _CHROMEDRIVER_PATH
+    if _CHROMEDRIVER_PATH is None:
+        with _CHROMEDRIVER_LOCK:
+            if _CHROMEDRIVER_PATH is None:
+                from webdriver_manager.chrome import ChromeDriverManager
+                _CHROMEDRIVER_PATH = ChromeDriverManager().install()
+    return _CHROMEDRIVER_PATH
+
 # ============================================================================
 # Browser Manager
 # ============================================================================
@@ -112,11 +163,12 @@ class SeleniumCDPBrowserManager:
         options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
         
         try:
-            service = Service(ChromeDriverManager().install())
+            service = Service(_get_driver_path())
             self.driver = webdriver.Chrome(service=service, options=options)
             
-            # Enable CDP Network domain
+            # Enable CDP Network domain and drop heavy resources inside Chromium
             self.driver.execute_cdp_cmd('Network.enable', {})
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_GLOBS})
             
             logger.info("✅ Selenium Chrome WebDriver started successfully")
         except Exception as e:
@@ -150,6 +202,147 @@ class SeleniumCDPBrowserManager:
         self.stop()
 
 
+class SeleniumCDPBrowserPool:
+    """
+    Bounded pool of started SeleniumCDPBrowserManager instances.
+    
+    All drivers are launched up front (concurrently) so their startup overlaps;
+    workers then check one out per URL. A driver is only ever used by the thread
+    that holds it, so any thread may acquire any driver.
+    """
+    
+    def __init__(self, pool_size: int = 4, **manager_kwargs):
+        """
+        Args:
+            pool_size: Number of drivers to launch
+            **manager_kwargs: Passed to each SeleniumCDPBrowserManager
+        """
+        self._idle = queue.Queue()
+        self._managers = [SeleniumCDPBrowserManager(**manager_kwargs) for _ in range(max(1, pool_size))]
+        
+        with ThreadPoolExecutor(max_workers=len(self._managers)) as executor:
+            futures = [executor.submit(m.start) for m in self._managers]
+        try:
+            for future in futures:
+                future.result()
+        except Exception:
+            self.close()
+            raise
+        
+        for manager in self._managers:
+            self._idle.put(manager)
+        logger.info(f"✅ Selenium driver pool ready ({len(self._managers)} drivers)")
+    
+    @contextmanager
+    def acquire(self):
+        """
+        Check out an idle driver manager, blocking until one is free.
+        
+        If the caller raises, the driver may be dead or wedged, so it is
+        restarted before going back to the pool.
+        """
+        manager = self._idle.get()
+        try:
+            yield manager
+        except Exception:
+            manager.stop()
+            try:
+                manager.start()
+            except Exception as e:
+                # get_driver() will try again on the next checkout
+                logger.warning(f"⚠️ Could not restart pooled driver: {e}")
+            raise
+        finally:
+            self._idle.put(manager)
+    
+    def close(self):
+        """Stop every driver in the pool."""
+        for manager in self._managers:
+            manager.stop()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+# ============================================================================
+# CDP Event Stream
+# ============================================================================
+
+class CDPEventStream:
+    """
+    Push feed of Network.responseReceived events straight from Chrome's DevTools socket.
+    
+    Opens a second CDP client on the driver's page target (Chrome allows several)
+    and auto-attaches to out-of-process iframes, where embedded players usually
+    live. A reader thread forwards only the matching events into `events`
+    (None once the socket closes), so the capture loop blocks on the queue
+    instead of polling and JSON-decoding the whole performance log.
+    """
+    
+    def __init__(self, driver):
+        address = driver.capabilities['goog:chromeOptions']['debuggerAddress']
+        with urllib.request.urlopen(f"http://{address}/json/list", timeout=5) as resp:
+            pages = [t for t in json.load(resp) if t.get('type') == 'page']
+        handle = driver.current_window_handle  # chromedriver handles are target ids
+        target = next((t for t in pages if t.get('id') and handle.endswith(t['id'])),
+                      pages[0] if pages else None)
+        if target is None:
+            raise RuntimeError("No page target on the DevTools endpoint")
+        
+        # Chrome rejects DevTools sockets that send an Origin header
+        self._ws = websocket.create_connection(
+            target['webSocketDebuggerUrl'], timeout=5, suppress_origin=True)
+        self._ws.settimeout(None)
+        self._ids = itertools.count(1)
+        self.events = queue.Queue()
+        
+        self._send('Network.enable')
+        self._send('Target.setAutoAttach',
+                   {'autoAttach': True, 'waitForDebuggerOnStart': False, 'flatten': True})
+        self._reader = threading.Thread(target=self._read, name="cdp-events", daemon=True)
+        self._reader.start()
+    
+    def _send(self, method: str, params: Optional[Dict[str, Any]] = None,
+              session_id: Optional[str] = None):
+        message = {'id': next(self._ids), 'method': method, 'params': params or {}}
+        if session_id:
+            message['sessionId'] = session_id
+        self._ws.send(json.dumps(message))
+    
+    def _read(self):
+        try:
+            while True:
+                raw = self._ws.recv()
+                # Substring tests first - most frames are events nobody here cares about
+                if '"Network.responseReceived"' in raw:
+                    self.events.put(json.loads(raw).get('params', {}))
+                elif '"Target.attachedToTarget"' in raw:
+                    # Out-of-process iframes (e.g. the Kaltura player) don't inherit
+                    # the page's blocklist - give each session its own copy
+                    session_id = json.loads(raw)['params']['sessionId']
+                    self._send('Network.enable', session_id=session_id)
+                    self._send('Network.setBlockedURLs', {'urls': BLOCKED_URL_GLOBS},
+                               session_id=session_id)
+        except Exception:
+            pass  # socket closed
+        finally:
+            self.events.put(None)
+    
+    def close(self):
+        """Close the socket and stop the reader thread."""
+        try:
+            # A closing handshake would wait on Chrome; shutting the socket down also
+            # wakes the reader blocked in recv()
+            self._ws.sock.shutdown(socket.SHUT_RDWR)
+            self._ws.shutdown()
+        except Exception:
+            pass
+        self._reader.join(timeout=2)
+
+
 # ============================================================================
 # M3U8 Capture via CDP
 # ============================================================================
@@ -190,6 +383,7 @@ def capture_m3u8_via_selenium_cdp(
     logger.info(f"🎬 Starting m3u8 capture (Selenium+CDP) for: {url}")
     
     found_m3u8s: List[M3U8Info] = []
+    seen_urls = set()
     master_found_time = None
     
     # Use provided driver manager or create temporary one
@@ -201,10 +395,63 @@ def capture_m3u8_via_selenium_cdp(
         manager = SeleniumCDPBrowserManager()
         manager.start()
     
+    def handle_response(params: Dict[str, Any]):
+        """Record a Network.responseReceived event if it is a successful m3u8 response."""
+        nonlocal master_found_time
+        response = params.get('response', {})
+        
+        response_url = response.get('url', '')
+        status = response.get('status', 0)
+        headers = response.get('headers', {})
+        
+        # Only process successful responses
+        if status < 200 or status >= 400:
+            return
+        
+        # Check if this is m3u8
+        content_type = headers.get('content-type', '')
+        content_type = content_type or headers.get('Content-Type', '')
+        
+        is_m3u8_by_url = is_m3u8_url(response_url)
+        is_m3u8_by_content = is_hls_content_type(content_type)
+        
+        if is_m3u8_by_url or is_m3u8_by_content:
+            # Analyze and store, skipping URLs already captured
+            m3u8_info = analyze_if_new(
+                url=response_url,
+                seen=seen_urls,
+                timestamp=time.time(),
+                response_headers=headers,
+                status_code=status,
+                initiator=None  # Could be extracted from Network.requestWillBeSent
+            )
+            
+            if m3u8_info is not None:
+                found_m3u8s.append(m3u8_info)
+                
+                detection_method = "URL" if is_m3u8_by_url else "Content-Type"
+                logger.info(
+                    f"✅ Detected m3u8 via {detection_method}: {response_url[:80]}... "
+                    f"(master={m3u8_info.is_master})"
+                )
+                
+                # Early exit if master found
+                if m3u8_info.is_master and master_found_time is None:
+                    master_found_time = time.time()
+                    logger.info("🎯 Master manifest detected! Will exit early.")
+    
     try:
         driver = manager.get_driver()
         driver.set_page_load_timeout(timeout)
         
+        # Subscribe before navigating so no early response is missed
+        stream = None
+        if WEBSOCKET_AVAILABLE:
+            try:
+                stream = CDPEventStream(driver)
+            except Exception as e:
+                logger.debug(f"CDP event stream unavailable, polling performance log: {e}")
+        
         # Navigate to page
         logger.info(f"📄 Navigating to: {url}")
         try:
@@ -221,83 +468,77 @@ def capture_m3u8_via_selenium_cdp(
             except Exception as e:
                 logger.debug(f"Error clicking play buttons: {e}")
         
-        # Poll performance logs for Network events
-        logger.info(f"⏳ Polling network events for {wait_after_load}s...")
         start_time = time.time()
-        check_interval = 0.3
+        deadline = start_time + wait_after_load
         
-        while time.time() - start_time < wait_after_load:
-            # Process performance logs
+        if stream is not None:
+            # Events are pushed as they happen - block on the queue, no polling
+            logger.info(f"⏳ Listening for network events for {wait_after_load}s...")
             try:
-                logs = driver.get_log('performance')
-                
-                for entry in logs:
+                while True:
+                    now = time.time()
+                    remaining = deadline - now
+                    if master_found_time:
+                        grace = _master_grace(found_m3u8s, master_found_time, now)
+                        if grace <= 0:
+                            logger.info("🚀 Master manifest found, exiting early!")
+                            break
+                        remaining = min(remaining, grace)
+                    if remaining <= 0:
+                        break
                     try:
-                        log_message = json.loads(entry['message'])['message']
-                        method = log_message.get('method', '')
-                        
-                        # We're interested in Network.responseReceived events
-                        if method == 'Network.responseReceived':
-                            params = log_message.get('params', {})
-                            response = params.get('response', {})
-                            
-                            response_url = response.get('url', '')
-                            status = response.get('status', 0)
-                            headers = response.get('headers', {})
-                            
-                            # Only process successful responses
-                            if status < 200 or status >= 400:
-                                continue
-                            
-                            # Check if this is m3u8
-                            content_type = headers.get('content-type', '').lower()
-                            content_type = content_type or headers.get('Content-Type', '').lower()
-                            
-                            is_m3u8_by_url = is_m3u8_url(response_url)
-                            is_m3u8_by_content = is_hls_content_type(content_type)
-                            
-                            if is_m3u8_by_url or is_m3u8_by_content:
-                                # Get request info if available
-                                request_id = params.get('requestId')
-                                frame_id = params.get('frameId')
-                                
-                                # Analyze and store
-                                m3u8_info = analyze_m3u8_url(
-                                    url=response_url,
-                                    timestamp=time.time(),
-                                    response_headers=headers,
-                                    status_code=status,
-                                    initiator=None  # Could be extracted from Network.requestWillBeSent
-                                )
-                                
-                                # Avoid duplicates
-                                if not any(m.url == m3u8_info.url for m in found_m3u8s):
-                                    found_m3u8s.append(m3u8_info)
-                                    
-                                    detection_method = "URL" if is_m3u8_by_url else "Content-Type"
-                                    logger.info(
-                                        f"✅ Detected m3u8 via {detection_method}: {response_url[:80]}... "
-                                        f"(master={m3u8_info.is_master})"
-                                    )
-                                    
-                                    # Early exit if master found
-                                    if m3u8_info.is_master and master_found_time is None:
-                                        master_found_time = time.time()
-                                        logger.info("🎯 Master manifest detected! Will exit early.")
-                    
-                    except (json.JSONDecodeError, KeyError, TypeError) as e:
-                        logger.debug(f"Error parsing log entry: {e}")
+                        params = stream.events.get(timeout=remaining)
+                    except queue.Empty:
                         continue
+                    if params is None:  # socket closed
+                        logger.debug("CDP event stream closed")
+                        break
+                    handle_response(params)
+            finally:
+                stream.close()
+                try:
+                    driver.get_log('performance')  # discard the unread buffer in one call
+                except Exception:
+                    pass
+        else:
+            # Poll performance logs for Network events
+            logger.info(f"⏳ Polling network events for {wait_after_load}s...")
+            check_interval = 0.3
             
-            except Exception as e:
-                logger.debug(f"Error getting performance logs: {e}")
-            
-            # Early exit if master found
-            if master_found_time and (time.time() - master_found_time > 1.0):
-                logger.info("🚀 Master manifest found, exiting early!")
-                break
-            
-            time.sleep(check_interval)
+            while time.time() < deadline:
+                # Process performance logs
+                try:
+                    logs = driver.get_log('performance')
+                    
+                    for entry in logs:
+                        try:
+                            raw = entry['message']
+                            # Cheap substring test first - most entries are other events
+                            if '"Network.responseReceived"' not in raw:
+                                continue
+                            log_message = json.loads(raw)['message']
+                            
+                            # We're interested in Network.responseReceived events
+                            if log_message.get('method', '') == 'Network.responseReceived':
+                                handle_response(log_message.get('params', {}))
+                        
+                        except (json.JSONDecodeError, KeyError, TypeError) as e:
+                            logger.debug(f"Error parsing log entry: {e}")
+                            continue
+                
+                except Exception as e:
+                    logger.debug(f"Error getting performance logs: {e}")
+                
+                # Early exit if master found
+                if master_found_time:
+                    grace = _master_grace(found_m3u8s, master_found_time, time.time())
+                    if grace <= 0:
+                        logger.info("🚀 Master manifest found, exiting early!")
+                        break
+                    time.sleep(min(check_interval, grace))
+                    continue
+                
+                time.sleep(check_interval)
         
         logger.info(f"✅ Capture complete. Found {len(found_m3u8s)} m3u8 URLs")
     
@@ -309,6 +550,13 @@ def capture_m3u8_via_selenium_cdp(
     return found_m3u8s
 
 
+def _master_grace(found_m3u8s: List[M3U8Info], master_found_time: float, now: float) -> float:
+    """Seconds left to wait after a master was seen (0 once a variant playlist is in)."""
+    if not all(m.is_master for m in found_m3u8s):
+        return 0.0
+    return master_found_time + MASTER_GRACE_PERIOD - now
+
+
 def _click_play_buttons_selenium(driver):
     """
     Attempt to click play buttons using Selenium.
@@ -316,22 +564,9 @@ def _click_play_buttons_selenium(driver):
     Args:
         driver: Selenium WebDriver
     """
-    from selenium.webdriver.common.by import By
-    
     logger.debug("🎬 Attempting to click play buttons...")
     
-    # Common play button selectors
-    play_button_selectors = [
-        (By.CSS_SELECTOR, 'button.playkit-pre-playback-play-button'),
-        (By.CSS_SELECTOR, 'button.vjs-big-play-button'),
-        (By.CSS_SELECTOR, 'button[title="Play"]'),
-        (By.CSS_SELECTOR, 'button[aria-label*="Play"]'),
-        (By.CSS_SELECTOR, 'button[aria-label*="נגן"]'),
-        (By.CSS_SELECTOR, '.play-button'),
-        (By.XPATH, '//button[contains(@class, "play")]'),
-    ]
-    
-    for by, selector in play_button_selectors:
+    for by, selector in ((By.CSS_SELECTOR, PLAY_BUTTON_CSS), (By.XPATH, PLAY_BUTTON_XPATH)):
         try:
             elements = driver.find_elements(by, selector)
             for element in elements:
@@ -372,51 +607,60 @@ def capture_m3u8_from_urls_selenium(
     urls: List[str],
     timeout: int = 20,
     wait_after_load: float = 3.0,
-    reuse_driver: bool = True
+    reuse_driver: bool = True,
+    concurrency: int = 4
 ) -> Dict[str, List[M3U8Info]]:
     """
     Capture m3u8 URLs from multiple pages using Selenium+CDP.
     
+    Up to `concurrency` pages are captured at the same time. With reuse_driver
+    the drivers come from a SeleniumCDPBrowserPool, so each one is launched
+    once and then serves many URLs.
+    
     Args:
         urls: List of page URLs to process
         timeout: Navigation timeout per URL
         wait_after_load: Wait time after page load
         reuse_driver: Whether to reuse driver instance
+        concurrency: Maximum number of pages captured at the same time
         
     Returns:
-        Dictionary mapping URL -> List[M3U8Info]
+        Dictionary mapping URL -> List[M3U8Info] (in input order)
     """
-    results = {}
+    results = {url: [] for url in urls}
+    workers = max(1, min(concurrency, len(urls)))
+    
+    def run(url, manager=None):
+        results[url] = capture_m3u8_via_selenium_cdp(
+            url,
+            driver_manager=manager,
+            timeout=timeout,
+            wait_after_load=wait_after_load
+        )
+    
+    def capture(url):
+        try:
+            run(url)
+        except Exception as e:
+            logger.error(f"❌ Error processing {url}: {e}")
     
     if reuse_driver:
-        logger.info(f"🚀 Processing {len(urls)} URLs with driver reuse")
-        with SeleniumCDPBrowserManager() as manager:
-            for url in urls:
+        logger.info(f"🚀 Processing {len(urls)} URLs with driver reuse ({workers} drivers)")
+        with SeleniumCDPBrowserPool(pool_size=workers) as pool:
+            def pooled_capture(url):
+                # Let errors reach acquire() so it can restart the driver
                 try:
-                    m3u8s = capture_m3u8_via_selenium_cdp(
-                        url,
-                        driver_manager=manager,
-                        timeout=timeout,
-                        wait_after_load=wait_after_load
-                    )
-                    results[url] = m3u8s
+                    with pool.acquire() as manager:
+                        run(url, manager)
                 except Exception as e:
                     logger.error(f"❌ Error processing {url}: {e}")
-                    results[url] = []
+            
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(pooled_capture, urls))
     else:
-        logger.info(f"🚀 Processing {len(urls)} URLs with fresh drivers")
-        for url in urls:
-            try:
-                m3u8s = capture_m3u8_via_selenium_cdp(
-                    url,
-                    driver_manager=None,
-                    timeout=timeout,
-                    wait_after_load=wait_after_load
-                )
-                results[url] = m3u8s
-            except Exception as e:
-                logger.error(f"❌ Error processing {url}: {e}")
-                results[url] = []
+        logger.info(f"🚀 Processing {len(urls)} URLs with fresh drivers ({workers} at a time)")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(capture, urls))
     
     return results
 
@@ -454,15 +698,5 @@ def capture_m3u8_via_cdp_selenium(
     prioritized = filter_and_prioritize_m3u8s(m3u8_infos)
     
     # Return as dictionaries
-    return [{
-        'url': info.url,
-        'timestamp': info.timestamp,
-        'initiator': info.initiator,
-        'response_headers': info.response_headers,
-        'status': info.status_code,
-        'is_master': info.is_master,
-        'is_kaltura': info.is_kaltura,
-        'entry_id': info.entry_id,
-        'flavor_id': info.flavor_id,
-    } for info in prioritized]
+    return [info.to_dict() for info in prioritized]
 
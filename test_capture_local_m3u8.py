@@ -15,13 +15,12 @@ Author: AI Assistant
 License: MIT
 """
 
-import os
 import sys
 import time
+import importlib.util
+import socket
 import threading
-from http.server import HTTPServer, SimpleHTTPRequestHandler
-import tempfile
-import shutil
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import logging
 
 # Configure logging
@@ -122,15 +121,41 @@ HTML_PAGE_WITH_VIDEO = """<!DOCTYPE html>
 """
 
 
-class M3U8Handler(SimpleHTTPRequestHandler):
-    """Custom handler that serves m3u8 files with correct Content-Type."""
+# Served straight from memory: path -> (Content-Type, body)
+FILES = {
+    '/master.m3u8': ('application/vnd.apple.mpegurl', MASTER_MANIFEST.encode()),
+    '/variant_720p.m3u8': ('application/vnd.apple.mpegurl', VARIANT_720P.encode()),
+    '/variant_1080p.m3u8': ('application/vnd.apple.mpegurl', VARIANT_1080P.encode()),
+    '/variant_360p.m3u8': ('application/vnd.apple.mpegurl', VARIANT_360P.encode()),
+    '/index.html': ('text/html; charset=utf-8', HTML_PAGE_WITH_VIDEO.encode()),
+}
+FILES['/'] = FILES['/index.html']
+
+
+class M3U8Handler(BaseHTTPRequestHandler):
+    """Serves the sample files from FILES with correct Content-Type and CORS headers."""
+    
+    def do_GET(self):
+        """Send the file body."""
+        self._send(head_only=False)
     
-    def end_headers(self):
-        """Add CORS and Content-Type headers."""
+    def do_HEAD(self):
+        """Send the headers only."""
+        self._send(head_only=True)
+    
+    def _send(self, head_only):
+        entry = FILES.get(self.path.split('?', 1)[0])
+        if entry is None:
+            self.send_error(404, "File not found")
+            return
+        content_type, data = entry
+        self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
-        if self.path.endswith('.m3u8'):
-            self.send_header('Content-Type', 'application/vnd.apple.mpegurl')
-        SimpleHTTPRequestHandler.end_headers(self)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(data)
     
     def log_message(self, format, *args):
         """Log requests."""
@@ -141,39 +166,31 @@ def setup_test_server(port=8888):
     """
     Set up a local HTTP server with sample HLS files.
     
+    The browser fetches the master and variants concurrently, so requests are
+    handled on threads; files are served from memory, with no temp directory.
+    
     Returns:
-        Tuple of (server, temp_dir, base_url)
+        Tuple of (server, base_url)
     """
-    # Create temporary directory
-    temp_dir = tempfile.mkdtemp(prefix='m3u8_test_')
-    logger.info(f"Created temp directory: {temp_dir}")
-    
-    # Write manifest files
-    with open(os.path.join(temp_dir, 'master.m3u8'), 'w') as f:
-        f.write(MASTER_MANIFEST)
-    
-    with open(os.path.join(temp_dir, 'variant_720p.m3u8'), 'w') as f:
-        f.write(VARIANT_720P)
-    
-    with open(os.path.join(temp_dir, 'variant_1080p.m3u8'), 'w') as f:
-        f.write(VARIANT_1080P)
-    
-    with open(os.path.join(temp_dir, 'variant_360p.m3u8'), 'w') as f:
-        f.write(VARIANT_360P)
-    
-    with open(os.path.join(temp_dir, 'index.html'), 'w') as f:
-        f.write(HTML_PAGE_WITH_VIDEO)
-    
-    logger.info("Created test manifest files")
-    
-    # Create HTTP server
-    os.chdir(temp_dir)
-    server = HTTPServer(('127.0.0.1', port), M3U8Handler)
+    server = ThreadingHTTPServer(('127.0.0.1', port), M3U8Handler)
+    server.daemon_threads = True
     base_url = f"http://127.0.0.1:{port}"
     
     logger.info(f"✅ Test server ready at {base_url}")
     
-    return server, temp_dir, base_url
+    return server, base_url
+
+
+def wait_for_server(address, timeout=5.0):
+    """Poll until the server accepts TCP connections (or the timeout passes)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(address, timeout=0.05).close()
+            return True
+        except OSError:
+            time.sleep(0.01)
+    return False
 
 
 def run_server(server):
@@ -188,15 +205,13 @@ def test_playwright_capture(base_url):
     logger.info("TEST: Playwright M3U8 Capture")
     logger.info("=" * 60)
     
+    # Checked without importing anything, so a skipped test costs no imports
+    if importlib.util.find_spec('playwright') is None:
+        logger.warning("⚠️ Playwright not available, skipping test")
+        return False
+    
     try:
-        from m3u8_capture_playwright import (
-            capture_m3u8_via_playwright,
-            PLAYWRIGHT_AVAILABLE
-        )
-        
-        if not PLAYWRIGHT_AVAILABLE:
-            logger.warning("⚠️ Playwright not available, skipping test")
-            return False
+        from m3u8_capture_playwright import capture_m3u8_via_playwright
         
         test_url = f"{base_url}/index.html"
         logger.info(f"Testing URL: {test_url}")
@@ -238,6 +253,10 @@ def test_selenium_cdp_capture(base_url):
     logger.info("TEST: Selenium CDP M3U8 Capture")
     logger.info("=" * 60)
     
+    if importlib.util.find_spec('selenium') is None:
+        logger.warning("⚠️ Selenium not available, skipping test")
+        return False
+    
     try:
         from m3u8_capture_selenium_cdp import capture_m3u8_via_selenium_cdp
         
@@ -278,12 +297,13 @@ def main():
     logger.info("🚀 Starting M3U8 Capture Local Test Suite")
     
     # Start test server
-    server, temp_dir, base_url = setup_test_server(port=8888)
+    server, base_url = setup_test_server(port=8888)
     server_thread = threading.Thread(target=run_server, args=(server,), daemon=True)
     server_thread.start()
     
     # Wait for server to be ready
-    time.sleep(1)
+    if not wait_for_server(server.server_address):
+        logger.warning("⚠️ Test server did not accept connections within 5s")
     
     try:
         # Run tests
@@ -317,11 +337,7 @@ def main():
         # Cleanup
         logger.info("Cleaning up...")
         server.shutdown()
-        try:
-            shutil.rmtree(temp_dir)
-            logger.info(f"Removed temp directory: {temp_dir}")
-        except Exception as e:
-            logger.warning(f"Failed to remove temp directory: {e}")
+        server.server_close()
 
 
 if __name__ == '__main__':
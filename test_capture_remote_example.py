@@ -16,6 +16,7 @@ License: MIT
 
 import sys
 import logging
+import importlib.util
 from typing import List
 
 # Configure logging
@@ -42,6 +43,39 @@ TEST_STREAMS = [
 ]
 
 
+# (input, expected) tables for test_direct_m3u8_access
+M3U8_URL_CASES = [
+    ("https://example.com/video.m3u8", True),
+    ("https://example.com/video.m3u8?token=abc", True),
+    ("https://example.com/master.m3u8", True),
+    ("https://example.com/video.mp4", False),
+    ("https://example.com/playlist.m3u8", True),
+]
+
+CONTENT_TYPE_CASES = [
+    ("application/vnd.apple.mpegurl", True),
+    ("application/x-mpegurl", True),
+    ("video/mp4", False),
+    ("text/html", False),
+]
+
+MASTER_URL_CASES = [
+    ("https://example.com/master.m3u8", True),
+    ("https://cdnapisec.kaltura.com/playmanifest/entryId/abc123/format/applehttp/protocol/https/a.m3u8", True),
+]
+
+
+def _count_failures(check, cases) -> int:
+    """Run check over (input, expected) cases, logging only the mismatches."""
+    failed = 0
+    for value, expected in cases:
+        result = check(value)
+        if result != expected:
+            logger.error(f"❌ {check.__name__}({value[:60]!r}) -> {result} (expected {expected})")
+            failed += 1
+    return failed
+
+
 def test_direct_m3u8_access():
     """
     Test that the utilities can correctly identify m3u8 URLs directly.
@@ -57,66 +91,19 @@ def test_direct_m3u8_access():
             is_m3u8_url,
             is_hls_content_type,
             detect_master_vs_variant,
-            clean_m3u8_url
         )
         
-        # Test URL pattern detection
-        test_urls = [
-            ("https://example.com/video.m3u8", True),
-            ("https://example.com/video.m3u8?token=abc", True),
-            ("https://example.com/master.m3u8", True),
-            ("https://example.com/video.mp4", False),
-            ("https://example.com/playlist.m3u8", True),
-        ]
-        
-        passed = 0
-        failed = 0
-        
-        for url, expected in test_urls:
-            result = is_m3u8_url(url)
-            if result == expected:
-                logger.info(f"✅ {url[:50]}... -> {result}")
-                passed += 1
-            else:
-                logger.error(f"❌ {url[:50]}... -> {result} (expected {expected})")
-                failed += 1
-        
-        # Test content-type detection
-        content_types = [
-            ("application/vnd.apple.mpegurl", True),
-            ("application/x-mpegurl", True),
-            ("video/mp4", False),
-            ("text/html", False),
-        ]
-        
-        for ct, expected in content_types:
-            result = is_hls_content_type(ct)
-            if result == expected:
-                logger.info(f"✅ Content-Type '{ct}' -> {result}")
-                passed += 1
-            else:
-                logger.error(f"❌ Content-Type '{ct}' -> {result} (expected {expected})")
-                failed += 1
-        
-        # Test master vs variant detection
-        master_urls = [
-            "https://example.com/master.m3u8",
-            "https://cdnapisec.kaltura.com/playmanifest/entryId/abc123/format/applehttp/protocol/https/a.m3u8",
-        ]
-        
-        for url in master_urls:
-            result = detect_master_vs_variant(url)
-            if result:
-                logger.info(f"✅ Detected as master: {url[:60]}...")
-                passed += 1
-            else:
-                logger.warning(f"⚠️ Not detected as master: {url[:60]}...")
-                failed += 1
+        # URL pattern, content-type and master vs variant detection
+        failed = (
+            _count_failures(is_m3u8_url, M3U8_URL_CASES)
+            + _count_failures(is_hls_content_type, CONTENT_TYPE_CASES)
+            + _count_failures(detect_master_vs_variant, MASTER_URL_CASES)
+        )
         
         # Summary
-        total = passed + failed
+        total = len(M3U8_URL_CASES) + len(CONTENT_TYPE_CASES) + len(MASTER_URL_CASES)
         logger.info(f"\n{'='*60}")
-        logger.info(f"Passed: {passed}/{total}")
+        logger.info(f"Passed: {total - failed}/{total}")
         logger.info(f"Failed: {failed}/{total}")
         
         return failed == 0
@@ -140,15 +127,13 @@ def test_playwright_remote_capture():
     logger.info("TEST: Playwright Remote M3U8 Capture")
     logger.info("=" * 60)
     
+    # Checked without importing anything, so a skipped test costs no imports
+    if importlib.util.find_spec('playwright') is None:
+        logger.warning("⚠️ Playwright not available, skipping test")
+        return None
+    
     try:
-        from m3u8_capture_playwright import (
-            capture_m3u8_via_playwright,
-            PLAYWRIGHT_AVAILABLE
-        )
-        
-        if not PLAYWRIGHT_AVAILABLE:
-            logger.warning("⚠️ Playwright not available, skipping test")
-            return None
+        from m3u8_capture_playwright import capture_m3u8_via_playwright
         
         # Note: For direct m3u8 URLs, the browser might just download them
         # rather than play them, so network events might not fire.
@@ -175,6 +160,10 @@ def test_selenium_cdp_remote_capture():
     logger.info("TEST: Selenium CDP Remote M3U8 Capture")
     logger.info("=" * 60)
     
+    if importlib.util.find_spec('selenium') is None:
+        logger.warning("⚠️ Selenium not available, skipping test")
+        return None
+    
     try:
         from m3u8_capture_selenium_cdp import capture_m3u8_via_selenium_cdp
         
@@ -226,6 +215,13 @@ def test_kaltura_detection():
                 'expected_master': False,
                 'expected_entry': None,
                 'expected_flavor': None
+            },
+            {
+                'url': 'https://example.com/video.m3u8?src=cdnapisec.kaltura.com',
+                'expected_kaltura': False,
+                'expected_master': False,
+                'expected_entry': None,
+                'expected_flavor': None
             }
         ]
         